@@ -5,3 +5,5 @@ This module:
 - provides a command to import categories from csv
 - initialize the views for the rest api
 """
+
+default_app_config = 'channels.apps.ChannelsConfig'
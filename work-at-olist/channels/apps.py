@@ -10,3 +10,24 @@ class ChannelsConfig(AppConfig):
     """
 
     name = 'channels'
+
+    def ready(self):
+        """Keep the tree indexes and snapshots of the channels up to date."""
+        from channels.models import Channel, channel_changed
+        from channels.snapshots import schedule_snapshot_removal
+        from channels.treeindex import (
+            schedule_tree_index, schedule_tree_index_removal
+        )
+        from django.db.models.signals import post_delete
+
+        channel_changed.connect(
+            schedule_tree_index, dispatch_uid='channels.treeindex'
+        )
+        post_delete.connect(
+            schedule_tree_index_removal, sender=Channel,
+            dispatch_uid='channels.treeindex.removal'
+        )
+        post_delete.connect(
+            schedule_snapshot_removal, sender=Channel,
+            dispatch_uid='channels.snapshots.removal'
+        )
@@ -0,0 +1,169 @@
+"""ASGI adapter serving the Django WSGI application from a thread pool.
+
+Django 1.11 has no async views, so the adapter does on the event loop only
+the parts of a request bound to the client: receiving the request body and
+sending the response. The view, along with its database queries, runs in a
+bounded ThreadPoolExecutor, so one process serves many concurrent slow
+clients while the number of threads, and of database connections, stays
+at most the size of the pool.
+
+Responses are iterated in the same thread as the view, because the
+database connections of Django belong to the thread that opened them, and
+each chunk is handed to the event loop as soon as it is read. Streaming
+responses, e.g. files and csv exports, are sent in constant memory, the
+thread waiting for the client to take each chunk before reading the next.
+
+Usage:
+    application = ASGIHandler(get_wsgi_application(), threads=10)
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+import sys
+import threading
+
+
+class ASGIHandler:
+    """ASGI application calling a WSGI application in a thread pool."""
+
+    def __init__(self, application, threads=10):
+        """Wrap the WSGI application, running at most threads requests."""
+        self.application = application
+        self.executor = ThreadPoolExecutor(max_workers=threads)
+
+    async def __call__(self, scope, receive, send):
+        """Serve an HTTP request or the lifespan events of the server."""
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            raise ValueError(
+                'Unsupported ASGI scope type: {}'.format(scope['type'])
+            )
+
+        body = await self.read_body(receive)
+        if body is None:
+            return
+
+        loop = asyncio.get_event_loop()
+        messages = asyncio.Queue(maxsize=1)
+        gone = threading.Event()
+
+        def emit(message):
+            """Hand a message to the loop, False once it is not sent."""
+            if gone.is_set():
+                return False
+            asyncio.run_coroutine_threadsafe(
+                messages.put(message), loop
+            ).result()
+            return not gone.is_set()
+
+        response = loop.run_in_executor(
+            self.executor, self.run, self.environ(scope, body), emit
+        )
+        try:
+            while True:
+                message = await messages.get()
+                if message is None:
+                    break
+                await send(message)
+        finally:
+            # Unblocks the thread, which stops reading the response
+            gone.set()
+            while not messages.empty():
+                messages.get_nowait()
+        await response
+
+    async def lifespan(self, receive, send):
+        """Acknowledge the startup and stop the threads on shutdown."""
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    @staticmethod
+    async def read_body(receive):
+        """Return the request body, None if the client disconnected."""
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return None
+            body += message.get('body', b'')
+            if not message.get('more_body', False):
+                return bytes(body)
+
+    @staticmethod
+    def environ(scope, body):
+        """Return the WSGI environ of the request of the scope."""
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', ''),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'REMOTE_ADDR': client[0],
+            'SERVER_PROTOCOL': 'HTTP/{}'.format(
+                scope.get('http_version', '1.1')
+            ),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+
+        for name, value in scope.get('headers', ()):
+            key = name.decode('latin-1').upper().replace('-', '_')
+            if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                key = 'HTTP_' + key
+            value = value.decode('latin-1')
+            environ[key] = environ[key] + ',' + value \
+                if key in environ else value
+        return environ
+
+    def run(self, environ, emit):
+        """Call the WSGI application, emitting the messages of the response.
+
+        emit blocks until the event loop takes each message, and returns
+        False once the client is gone. None is emitted last, even when the
+        application fails.
+        """
+        def start_response(status, headers, exc_info=None):
+            """Emit the status and the headers of the response."""
+            emit({
+                'type': 'http.response.start',
+                'status': int(status.split(' ', 1)[0]),
+                'headers': [
+                    (name.encode('latin-1'), value.encode('latin-1'))
+                    for name, value in headers
+                ]
+            })
+
+        try:
+            chunks = self.application(environ, start_response)
+            try:
+                for chunk in chunks:
+                    if chunk and not emit({
+                        'type': 'http.response.body',
+                        'body': chunk,
+                        'more_body': True
+                    }):
+                        return
+                emit({'type': 'http.response.body', 'body': b''})
+            finally:
+                # Sends request_finished, closing the connections of the thread
+                if hasattr(chunks, 'close'):
+                    chunks.close()
+        finally:
+            emit(None)
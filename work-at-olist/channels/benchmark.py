@@ -0,0 +1,524 @@
+"""Benchmarks of the importer and of the API endpoints.
+
+A synthetic catalogue of configurable size, depth and fan-out is written to
+a csv file and imported by each importcategories mode, then the latency and
+number of queries of each ChannelViewSet/CategoryViewSet action are measured
+on the imported categories. Cold requests run with empty caches, warm ones
+are served by the cache of the responses. The load test compares a single
+threaded WSGI server with uvicorn serving concurrent slow clients on local
+sockets.
+
+The results are plain dicts, so they can be dumped as JSON and compared
+with the results of another commit by compare.
+
+Usage:
+    results = run_benchmark(size=10000, depth=4, fanout=8)
+    regressions = compare(results, baseline, threshold=0.2)
+"""
+
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import csv
+from functools import partial
+from io import StringIO
+import os
+import platform
+import socket
+import sqlite3
+from statistics import median
+from tempfile import TemporaryDirectory
+import threading
+import time
+from timeit import repeat as timeit_repeat, timeit
+import uuid
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+from channels.asgi import ASGIHandler
+from channels.models import Category, Channel
+from channels.serializers import CategoryListSerializer
+from channels.utils import Attrgetter, cached_attrgetter, join_path, uuid7
+from django.core.cache import caches
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import uvicorn
+except ImportError:  # pragma: no cover
+    uvicorn = None
+
+
+IMPORT_MODES = ('default', 'bulk', 'stream')
+
+# Suffixes of the metrics compared by their relative change
+TIMING_METRICS = ('seconds', '.median', '.p95')
+
+# Timings growing less than this many seconds are considered noise
+MIN_TIMING_DELTA = 0.002
+
+
+def generate_catalogue(filename, size, depth, fanout):
+    """Write a csv with size category paths, parents before children.
+
+    Each tree has the given depth and each category has fanout children,
+    new trees are started until the file has size lines.
+    """
+    with open(filename, 'w') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(['Category'])
+
+        lines, root = 0, 0
+        while lines < size:
+            root += 1
+            stack = [([str(root)], ['Category {}'.format(root)])]
+            while stack and lines < size:
+                index, path = stack.pop()
+                writer.writerow([join_path(*path)])
+                lines += 1
+                if len(path) < depth:
+                    stack.extend(
+                        (index + [str(child)], path + ['Category {}'.format(
+                            '.'.join(index + [str(child)])
+                        )])
+                        for child in range(fanout, 0, -1)
+                    )
+    return lines
+
+
+def time_import(channel_name, filename, mode, batch_size=1000):
+    """Import the csv file with importcategories, returning the seconds."""
+    options = {'stdout': StringIO()}
+    if mode != 'default':
+        options.update({mode: True, 'batch_size': batch_size})
+
+    start = time.perf_counter()
+    call_command('importcategories', channel_name, filename, **options)
+    return time.perf_counter() - start
+
+
+def endpoints(channel):
+    """Return the urls of each API action, using categories of the channel.
+
+    The category details are measured for a root, an inner category and
+    the deepest leaf, which nest the most parents.
+    """
+    categories = Category.objects.filter(channel=channel)
+    root = categories.filter(level=0).order_by('tree_id').first()
+    inner = categories.filter(level=1).order_by('tree_id', 'lft').first()
+    leaf = categories.order_by('-level', 'tree_id', 'lft').first()
+
+    urls = OrderedDict([
+        ('channel-list', '/api/v1/channel/'),
+        ('channel-detail', '/api/v1/channel/{}/'.format(channel.reference)),
+        ('channel-stream',
+         '/api/v1/channel/{}/?format=ndjson'.format(channel.reference)),
+        ('category-list', '/api/v1/category/'),
+        ('category-list-channel',
+         '/api/v1/category/?channel={}'.format(channel.reference)),
+    ])
+    for name, category in (('root', root), ('inner', inner), ('leaf', leaf)):
+        if category is not None:
+            urls['category-detail-' + name] = '/api/v1/category/{}/'.format(
+                category.reference
+            )
+    return urls
+
+
+def summarize(durations):
+    """Return the median and 95th percentile of the durations."""
+    durations = sorted(durations)
+    return OrderedDict([
+        ('median', median(durations)),
+        ('p95', durations[min(
+            len(durations) - 1, int(round(0.95 * (len(durations) - 1)))
+        )])
+    ])
+
+
+def measure(client, url, repeat, cold):
+    """Request the url repeat times, returning the durations and queries.
+
+    Streamed responses are read to the end, so their duration includes the
+    whole body.
+    """
+    durations, queries = [], 0
+    for _ in range(repeat):
+        if cold:
+            for cache in caches.all():
+                cache.clear()
+
+        with CaptureQueriesContext(connection) as context:
+            start = time.perf_counter()
+            response = client.get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            durations.append(time.perf_counter() - start)
+
+        if response.status_code != 200:
+            raise ValueError('{url} returned {status}'.format(
+                url=url, status=response.status_code
+            ))
+        queries = len(context.captured_queries)
+    return durations, queries
+
+
+def slow_request(address, path, client_delay):
+    """Send a GET in two parts, client_delay seconds apart, return the status.
+
+    The request line is sent at once and the end of the headers after the
+    delay, like a client on a slow network.
+    """
+    with socket.create_connection(address) as client:
+        client.sendall(
+            'GET {path} HTTP/1.1\r\nHost: localhost\r\n'.format(
+                path=path
+            ).encode('latin-1')
+        )
+        time.sleep(client_delay)
+        client.sendall(b'Connection: close\r\n\r\n')
+
+        response = bytearray()
+        chunk = client.recv(65536)
+        while chunk:
+            response += chunk
+            chunk = client.recv(65536)
+    return int(response.split(b' ', 2)[1])
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """Request handler of the sync server, without the access log."""
+
+    def log_message(self, format, *args):
+        """Skip the log line of each request."""
+
+
+class SyncServer(WSGIServer):
+    """Single threaded WSGI server, reading one request at a time.
+
+    Like a sync worker of gunicorn, it is blocked reading the request of a
+    slow client until the client finishes sending it.
+    """
+
+    request_queue_size = 1024
+
+
+def serve_sync(address):
+    """Serve the WSGI application on address from a thread, return stop."""
+    server = SyncServer(address, QuietRequestHandler)
+    server.set_app(WSGIHandler())
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+
+    def stop():
+        """Stop the server and wait for its thread."""
+        server.shutdown()
+        thread.join()
+        server.server_close()
+    return server.server_address, stop
+
+
+def serve_async(address, threads):
+    """Serve the ASGI handler with uvicorn from a thread, return stop."""
+    sock = socket.socket()
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(address)
+    server = uvicorn.Server(uvicorn.Config(
+        ASGIHandler(WSGIHandler(), threads), interface='asgi3', loop='asyncio',
+        http='h11', lifespan='on', log_level='warning', access_log=False
+    ))
+    # Signals can only be handled by the main thread
+    server.install_signal_handlers = lambda: None
+
+    def run():
+        """Run the server on its own event loop."""
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        server.run(sockets=[sock])
+    thread = threading.Thread(target=run)
+    thread.start()
+    while not server.started and thread.is_alive():
+        time.sleep(0.01)
+
+    def stop():
+        """Stop the server and wait for its thread."""
+        server.should_exit = True
+        thread.join()
+        sock.close()
+    return sock.getsockname(), stop
+
+
+def load_test(url, clients=20, client_delay=0.05, threads=10):
+    """Serve concurrent slow clients with WSGI and ASGI, returning seconds.
+
+    Both servers listen on a local socket, where all the clients connect
+    at the same time, each taking client_delay seconds to send its
+    request. The sync server reads one request at a time, like a sync
+    worker of gunicorn, while uvicorn reads all of them on its event loop
+    and runs the views in at most threads threads of the ASGI handler.
+    Requires uvicorn.
+    """
+    if uvicorn is None:
+        raise ValueError('The load test requires uvicorn.')
+
+    results = OrderedDict([
+        ('url', url),
+        ('clients', clients),
+        ('client_delay', client_delay),
+        ('threads', threads)
+    ])
+    statuses = set()
+    servers = OrderedDict([
+        ('sync_seconds', serve_sync),
+        ('async_seconds', partial(serve_async, threads=threads))
+    ])
+    for name, serve in servers.items():
+        address, stop = serve(('127.0.0.1', 0))
+        try:
+            with ThreadPoolExecutor(max_workers=clients) as executor:
+                start = time.perf_counter()
+                statuses.update(executor.map(
+                    slow_request, [address] * clients, [url] * clients,
+                    [client_delay] * clients
+                ))
+                results[name] = time.perf_counter() - start
+        finally:
+            stop()
+
+    if statuses != {200}:
+        raise ValueError('{url} returned {statuses}'.format(
+            url=url, statuses=sorted(statuses)
+        ))
+    return results
+
+
+def serializer_benchmark(channel, repeat=10):
+    """Time listing all categories of the channel, returning the durations.
+
+    Compares serializing the model instances with CategoryListSerializer and
+    building the rows from .values() with its lean path, both rendered to
+    JSON, which must be the same bytes.
+    """
+    categories = Category.objects.filter(channel=channel).order_by(
+        'tree_id', 'lft'
+    )
+    renderer = JSONRenderer()
+
+    def model():
+        """Render the serialized model instances."""
+        return renderer.render(CategoryListSerializer(
+            CategoryListSerializer.setup_eager_loading(categories), many=True
+        ).data)
+
+    def lean():
+        """Render the rows built from the values."""
+        return renderer.render(CategoryListSerializer.lean_data(
+            CategoryListSerializer.lean_values(categories)
+        ))
+
+    if model() != lean():
+        raise ValueError('The lean rows render other JSON.')
+
+    return OrderedDict([
+        ('rows', categories.count()),
+        ('model', summarize(timeit_repeat(model, number=1, repeat=repeat))),
+        ('lean', summarize(timeit_repeat(lean, number=1, repeat=repeat)))
+    ])
+
+
+def key_benchmark(rows=100000, batch_size=1000, fanout=8):
+    """Insert rows with random and time-ordered ids, returning the costs.
+
+    For uuid4 and uuid7 ids, a scratch SQLite table shaped like the category
+    table, a char(32) primary key and an indexed parent id, is filled with a
+    tree of the given fan-out. Random ids land on random pages of the
+    indexes, which are split half full, time-ordered ids are appended to
+    the last pages. Returns the seconds and the size of each index.
+    """
+    results = OrderedDict()
+    with TemporaryDirectory() as directory:
+        for name, new_id in (('uuid4', uuid.uuid4), ('uuid7', uuid7)):
+            database = sqlite3.connect(os.path.join(directory, name))
+            database.execute('CREATE TABLE category (id char(32) NOT NULL '
+                             'PRIMARY KEY, parent_id char(32) NULL)')
+            database.execute(
+                'CREATE INDEX category_parent_id ON category (parent_id)'
+            )
+
+            ids = []
+            start = time.perf_counter()
+            for offset in range(0, rows, batch_size):
+                batch = []
+                for index in range(offset, min(rows, offset + batch_size)):
+                    ids.append(new_id().hex)
+                    batch.append((
+                        ids[index],
+                        ids[(index - 1) // fanout] if index else None
+                    ))
+                database.executemany(
+                    'INSERT INTO category VALUES (?, ?)', batch
+                )
+                database.commit()
+            seconds = time.perf_counter() - start
+
+            sizes = dict(database.execute(
+                'SELECT name, SUM(pgsize) FROM dbstat GROUP BY name'
+            ))
+            database.close()
+            results[name] = OrderedDict([
+                ('seconds', seconds),
+                ('rows_per_second', rows / seconds),
+                ('table_bytes', sizes.get('category')),
+                ('primary_key_bytes', sizes.get(
+                    'sqlite_autoindex_category_1'
+                )),
+                ('parent_index_bytes', sizes.get('category_parent_id'))
+            ])
+    return results
+
+
+def attrgetter_benchmark(number=100000):
+    """Time the Attrgetter of the category slugs, returning the seconds.
+
+    For a child and a root category (missing parent reference), compares
+    creating the getter on each call, as BaseModel.save used to, calling
+    only the Python getters, and calling the cached getter of the model,
+    which reads the required attributes with operator.attrgetter.
+    """
+    attrs = ('parent.reference', 'name')
+    objects = OrderedDict([
+        ('child', Category(
+            name='Fantasy', parent=Category(reference='amazon-books')
+        )),
+        ('root', Category(name='Books', parent=None))
+    ])
+
+    results = OrderedDict()
+    for name, obj in objects.items():
+        python = Attrgetter(*attrs)
+        getter = cached_attrgetter(*attrs, model=Category)
+        results[name] = OrderedDict([
+            ('uncached_seconds', timeit(
+                lambda: Attrgetter(*attrs, model=Category)(obj),
+                number=number
+            )),
+            ('python_seconds', timeit(
+                lambda: python(obj), number=number
+            )),
+            ('cached_seconds', timeit(
+                lambda: getter(obj), number=number
+            ))
+        ])
+    return results
+
+
+def run_benchmark(size=1000, depth=4, fanout=5, repeat=10, batch_size=1000,
+                  modes=IMPORT_MODES, clients=0, keys=0):
+    """Run the import and API benchmarks, returning the results.
+
+    Each mode imports the catalogue into its own new channel, the API is
+    measured on the channel of the first mode, as well as listing all of
+    its categories with and without the lean serializers. The Attrgetter is
+    called repeat * 10000 times. The load test, with clients concurrent
+    clients, runs when clients is not 0; its threads need the data
+    committed. The ids benchmark inserts keys rows, when not 0.
+    """
+    results = OrderedDict([
+        ('vendor', connection.vendor),
+        ('python', platform.python_version()),
+        ('parameters', OrderedDict([
+            ('size', size), ('depth', depth), ('fanout', fanout),
+            ('repeat', repeat), ('batch_size', batch_size),
+            ('clients', clients), ('keys', keys)
+        ])),
+        ('import', OrderedDict()),
+        ('endpoints', OrderedDict()),
+        ('attrgetter', attrgetter_benchmark(repeat * 10000))
+    ])
+
+    with TemporaryDirectory() as directory:
+        filename = os.path.join(directory, 'catalogue.csv')
+        generate_catalogue(filename, size, depth, fanout)
+
+        for mode in modes:
+            channel_name = 'Benchmark {}'.format(mode)
+            results['import'][mode] = OrderedDict([
+                ('seconds', time_import(
+                    channel_name, filename, mode, batch_size
+                )),
+                ('reimport_seconds', time_import(
+                    channel_name, filename, mode, batch_size
+                )),
+                ('categories', Category.objects.filter(
+                    channel__name=channel_name
+                ).count())
+            ])
+
+    channel = Channel.objects.get(name='Benchmark {}'.format(modes[0]))
+    client = Client()
+    for name, url in endpoints(channel).items():
+        cold, queries = measure(client, url, repeat, cold=True)
+        warm, warm_queries = measure(client, url, repeat, cold=False)
+        results['endpoints'][name] = OrderedDict([
+            ('url', url),
+            ('queries', queries),
+            ('warm_queries', warm_queries),
+            ('cold', summarize(cold)),
+            ('warm', summarize(warm))
+        ])
+
+    results['serializers'] = serializer_benchmark(channel, repeat)
+    if clients:
+        results['load'] = load_test(
+            '/api/v1/channel/{}/'.format(channel.reference), clients
+        )
+    if keys:
+        results['keys'] = key_benchmark(keys, batch_size)
+    return results
+
+
+def flatten(results, prefix=''):
+    """Return the numeric values of the results keyed by dotted names."""
+    metrics = OrderedDict()
+    for key, value in results.items():
+        name = prefix + str(key)
+        if isinstance(value, dict):
+            metrics.update(flatten(value, name + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            metrics[name] = value
+    return metrics
+
+
+def compare(results, baseline, threshold=0.2):
+    """Return the metrics of the results which regressed from the baseline.
+
+    Timings regress when they grow more than threshold (relative) and more
+    than MIN_TIMING_DELTA seconds, query counts regress whenever they grow.
+    Metrics missing from either side and runs with different parameters
+    are not compared.
+    """
+    if results.get('parameters') != baseline.get('parameters'):
+        raise ValueError('The baseline was run with other parameters.')
+
+    current = flatten(results)
+    regressions = []
+    for name, old in flatten(baseline).items():
+        new = current.get(name)
+        if new is None:
+            continue
+
+        if name.endswith(TIMING_METRICS):
+            regressed = new > old * (1 + threshold) and \
+                new - old > MIN_TIMING_DELTA
+        elif name.endswith('queries'):
+            regressed = new > old
+        else:
+            continue
+
+        if regressed:
+            regressions.append('{name}: {old:g} -> {new:g}'.format(
+                name=name, old=old, new=new
+            ))
+    return regressions
@@ -0,0 +1,85 @@
+"""Cache of the serialized channels and categories.
+
+Entries are versioned by the generation of the channels they depend on,
+which is incremented whenever a channel or its categories change, or by
+a COUNT/MAX(time_modified) aggregate of the rows they contain, so they
+are never invalidated explicitly: a new version simply uses new keys.
+
+The cache backend is selected by the TREE_CACHE setting, any backend of
+Django's cache framework can be used (locmem, file, memcached...).
+"""
+
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count, Max
+
+
+def channel_version(channel):
+    """Return the version of the data of a single channel."""
+    return '{pk}-{generation}'.format(
+        pk=channel.pk.hex, generation=channel.generation
+    )
+
+
+def queryset_version(queryset):
+    """Return the version and last modification of the rows of a queryset.
+
+    Both come from a single COUNT/MAX(time_modified) aggregate, so deleted
+    rows change the version as well as updated ones.
+    """
+    rows = queryset.aggregate(
+        count=Count('pk'), last_modified=Max('time_modified')
+    )
+    version = '{count}-{timestamp}'.format(
+        count=rows['count'],
+        timestamp=rows['last_modified'].timestamp()
+        if rows['last_modified'] else 0
+    )
+    return version, rows['last_modified']
+
+
+def catalogue_version(channels):
+    """Return the version and last modification of many channels.
+
+    The version is a digest of the id and generation of every channel, so
+    a deleted channel replaced by a new one with the same count and sum of
+    generations still gets a new version.
+    """
+    digest, count, last_modified = md5(), 0, None
+    for pk, generation, time_modified in channels.order_by('pk').values_list(
+            'pk', 'generation', 'time_modified'):
+        digest.update('{pk}-{generation},'.format(
+            pk=pk.hex, generation=generation
+        ).encode('ascii'))
+        count += 1
+        last_modified = max(last_modified or time_modified, time_modified)
+
+    version = '{count}-{digest}'.format(
+        count=count, digest=digest.hexdigest()[:16]
+    )
+    return version, last_modified
+
+
+def get_or_build(version, request, build):
+    """Return the cached data of the request, calling build on a miss.
+
+    Entries are keyed by the absolute url, since the data holds absolute
+    pagination links, and by the negotiated format of the response.
+    """
+    renderer = getattr(request, 'accepted_renderer', None)
+    key = 'channels:tree:{version}:{url}'.format(
+        version=version,
+        url=md5('{format} {url}'.format(
+            format=getattr(renderer, 'format', ''),
+            url=request.build_absolute_uri()
+        ).encode('utf-8')).hexdigest()
+    )
+    tree_cache = caches[settings.TREE_CACHE]
+
+    data = tree_cache.get(key)
+    if data is None:
+        data = build()
+        tree_cache.set(key, data, settings.TREE_CACHE_TIMEOUT)
+    return data
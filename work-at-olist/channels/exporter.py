@@ -0,0 +1,43 @@
+"""Export of the categories of a channel to the csv read by importcategories.
+
+The full path of every category, e.g. "Books / Fantasy", is written in tree
+order, so parents come before their children and siblings keep their order
+when the file is imported again.
+
+Usage:
+    for line in export_lines(channel):
+        output.write(line)
+"""
+
+import csv
+
+from channels.models import Category
+
+
+class Echo:
+    """File-like object whose write returns the written value.
+
+    Lets a csv.writer format each row without buffering the whole file.
+    """
+
+    @staticmethod
+    def write(value):
+        """Return the value instead of writing it."""
+        return value
+
+
+def export_lines(channel):
+    """Yield the csv lines of the categories of the channel, in tree order.
+
+    The paths are read by a single query ordered by (tree_id, lft) through
+    iterator(), a server-side cursor on PostgreSQL, so memory does not grow
+    with the number of categories.
+    """
+    writer = csv.writer(Echo(), lineterminator='\n')
+    yield writer.writerow(['Category'])
+
+    paths = Category.objects.filter(channel=channel).order_by(
+        'tree_id', 'lft'
+    ).values_list('path', flat=True).iterator()
+    for path in paths:
+        yield writer.writerow([path])
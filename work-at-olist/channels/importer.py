@@ -0,0 +1,462 @@
+"""Bulk import engine for the categories of a channel.
+
+Instead of calling ``get_or_create`` for every segment of every line, the
+importer parses the whole CSV into an in-memory tree, loads only the stored
+ancestors of the paths which are not stored yet, by their paths, and writes
+the missing nodes with ``bulk_create``. The MPTT columns (lft, rght, level
+and tree_id) of the new subtrees are computed in memory, and the stored
+trees make room for them with a few set-based updates.
+
+Large files are streamed by CsvStream in fixed size batches, each batch is
+imported and committed on its own together with an ImportCheckpoint, so an
+interrupted import can be resumed and memory does not grow with the file.
+
+Many channels can be imported at the same time by import_channel running in
+worker processes, each one with its own database connection.
+
+"""
+
+from collections import OrderedDict
+import csv
+import os
+import time
+
+from channels.models import Category, Channel, ImportCheckpoint
+from channels.snapshots import write_snapshot
+from channels.utils import join_path, split_path
+import django
+from django.db import connection, connections, DatabaseError, transaction
+from django.db.models import Case, F, IntegerField, Max, Value, When
+from django.utils.text import slugify
+
+
+# Key of the PostgreSQL advisory lock held while new tree ids are allocated
+TREE_ID_LOCK = 0x63617473
+
+
+def get_channel(channel_name):
+    """Return the channel with the given name, creating it if needed."""
+    channel, created = Channel.objects.get_or_create(
+        reference=slugify(channel_name),
+        defaults={'name': channel_name}
+    )
+    return channel
+
+
+def lock_tree_ids():
+    """Serialize the allocation of new tree ids between concurrent imports.
+
+    On PostgreSQL an advisory lock is held until the end of the transaction,
+    other databases already serialize concurrent writers.
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [TREE_ID_LOCK])
+
+
+class Node:
+    """A category in the in-memory tree built by the importer."""
+
+    __slots__ = (
+        'pk', 'name', 'parent', 'children', 'reference', 'path',
+        'tree_id', 'lft', 'rght', 'level', 'is_new'
+    )
+
+    def __init__(self, name, parent=None, pk=None, reference=None,
+                 mptt=(None, None, None, None)):
+        """Create a node, existing nodes keep their stored mptt values."""
+        self.pk = pk
+        self.name = name
+        self.parent = parent
+        self.children = OrderedDict()
+        self.reference = reference
+        self.path = None
+        self.tree_id, self.lft, self.rght, self.level = mptt
+        self.is_new = pk is None
+
+
+class BulkImporter:
+    """Set-based importer of the categories of a channel.
+
+    Usage:
+        importer = BulkImporter(channel)
+        importer.run(csv.DictReader(open(filename)))
+        importer.inserted, importer.updated, importer.timings
+    """
+
+    batch_size = 1000
+    gap_batch_size = 100
+    path_lookup_size = 500
+
+    def __init__(self, channel):
+        """Initialize an empty tree for the channel."""
+        self.channel = channel
+        self.roots = OrderedDict()
+        self.paths = []
+        self.tops = []
+        self.gaps = OrderedDict()
+        self.lines = 0
+        self.inserted = 0
+        self.updated = 0
+        self.timings = OrderedDict()
+
+    def run(self, lines):
+        """Import the lines of the csv file, timing each phase."""
+        self._timed('parse', self.parse, lines)
+        self._timed('diff', self.diff)
+        self._timed('build', self.build)
+        self._timed('write', self.write)
+        return self
+
+    def parse(self, lines):
+        """Read the category paths of the csv lines."""
+        for line in lines:
+            self.lines += 1
+            path = split_path(line.get('Category', ''))
+            if path:
+                self.paths.append(path)
+
+    def diff(self):
+        """Load the stored ancestors of the new csv paths.
+
+        Paths already stored are discarded first, using the indexed path
+        column, so unchanged lines do not load anything. The ancestors of
+        the others are then loaded by their paths, so the rows read are
+        bounded by the csv lines, not by the size of the stored trees.
+        """
+        self.paths = self._missing_paths()
+        ancestors = sorted({
+            join_path(*path[:end])
+            for path in self.paths for end in range(1, len(path))
+        })
+
+        existing = []
+        for start in range(0, len(ancestors), self.path_lookup_size):
+            existing.extend(Category.objects.select_for_update().filter(
+                channel=self.channel,
+                path__in=ancestors[start:start + self.path_lookup_size]
+            ).values_list(
+                'pk', 'parent_id', 'name', 'reference', 'path',
+                'tree_id', 'lft', 'rght', 'level'
+            ))
+
+        # Ordering by (tree_id, lft) guarantees parents come before children
+        nodes = {}
+        for pk, parent_id, name, reference, path, *mptt in sorted(
+                existing, key=lambda row: row[5:7]):
+            parent = nodes.get(parent_id)
+            node = Node(name, parent, pk, reference, tuple(mptt))
+            node.path = path
+            siblings = parent.children if parent else self.roots
+            siblings.setdefault(name, node)
+            nodes[pk] = node
+
+    def build(self):
+        """Merge the csv paths into the tree and compute the mptt columns.
+
+        New roots get new tree ids, new subtrees under stored categories
+        are appended as their last children, in the gaps which write opens
+        at the rght of their parents.
+        """
+        for path in self.paths:
+            siblings, parent = self.roots, None
+            for name in path:
+                node = siblings.get(name)
+                if node is None:
+                    node = siblings[name] = Node(name, parent)
+                    if parent is None or not parent.is_new:
+                        self.tops.append(node)
+                siblings, parent = node.children, node
+
+        self._number_roots()
+        self._number_children()
+
+    def _number_roots(self):
+        """Compute the mptt columns of the new roots, each in a new tree."""
+        roots = [top for top in self.tops if top.parent is None]
+        if not roots:
+            return
+
+        lock_tree_ids()
+        next_tree_id = (
+            Category.objects.aggregate(Max('tree_id'))['tree_id__max'] or 0
+        ) + 1
+        for tree_id, root in enumerate(roots, next_tree_id):
+            self._number(root, tree_id)
+
+    def _number_children(self):
+        """Compute the mptt columns of new subtrees of stored categories."""
+        children = OrderedDict()
+        for top in self.tops:
+            if top.parent is not None:
+                children.setdefault(top.parent, []).append(top)
+
+        # Gaps of a tree by position, each one shifting the ones after it
+        for parent in sorted(
+                children, key=lambda node: (node.tree_id, node.rght)):
+            gaps = self.gaps.setdefault(parent.tree_id, [])
+            start = parent.rght + sum(width for position, width in gaps)
+            counter = start
+            for top in children[parent]:
+                counter = self._number(
+                    top, parent.tree_id, counter, parent.level + 1
+                ) + 1
+            gaps.append((parent.rght, counter - start))
+
+    def write(self):
+        """Insert the new nodes and renumber the existing ones.
+
+        The references of the new categories are built in memory by
+        Category.build_references, from the parents held by the tree.
+        """
+        new, categories = [], {}
+
+        for node in self._walk(self.tops):
+            node.pk = Category._meta.pk.get_default()
+            node.path = join_path(
+                node.parent.path if node.parent else '', node.name
+            )
+            categories[node] = Category(
+                pk=node.pk,
+                channel=self.channel,
+                parent=self._category(node.parent, categories),
+                name=node.name,
+                path=node.path,
+                tree_id=node.tree_id,
+                lft=node.lft,
+                rght=node.rght,
+                level=node.level
+            )
+            new.append(categories[node])
+
+        Category.build_references(new)
+        for node, category in categories.items():
+            node.reference = category.reference
+
+        for tree_id, gaps in self.gaps.items():
+            self.updated += self._open_gaps(tree_id, gaps)
+        # Django 1.11 does not cap the given batch size to the backend limit
+        Category.objects.bulk_create(new, batch_size=min(
+            self.batch_size,
+            connection.ops.bulk_batch_size(Category._meta.concrete_fields, new)
+        ))
+        self.inserted = len(new)
+
+        if new:
+            Channel.bump_generation(self.channel.pk)
+
+    def _category(self, node, categories):
+        """Return the category of a node, as needed by build_references.
+
+        New nodes are already in categories, stored nodes only need their
+        primary key, channel and reference.
+        """
+        if node is None:
+            return None
+        if node not in categories:
+            categories[node] = Category(
+                pk=node.pk, channel=self.channel, reference=node.reference
+            )
+        return categories[node]
+
+    def _open_gaps(self, tree_id, gaps):
+        """Shift the stored lft and rght of a tree to make room for subtrees.
+
+        Gaps are (position, width) pairs in order, the values at or after
+        a position move by the widths of all the gaps up to it. Each UPDATE
+        applies gap_batch_size gaps with CASE expressions, from the last
+        ones, so shifted values still match the positions of the gaps
+        before them, and the last UPDATE reaches every shifted row.
+
+        Returns the number of stored categories renumbered.
+        """
+        updated = 0
+        batches = [
+            gaps[start:start + self.gap_batch_size]
+            for start in range(0, len(gaps), self.gap_batch_size)
+        ]
+        for batch in reversed(batches):
+            shifts, total = [], 0
+            for position, width in batch:
+                total += width
+                shifts.insert(0, (position, total))
+
+            updated = Category.objects.filter(
+                channel=self.channel, tree_id=tree_id, rght__gte=batch[0][0]
+            ).update(**{
+                column: F(column) + Case(
+                    *[When(then=Value(shift), **{column + '__gte': position})
+                      for position, shift in shifts],
+                    default=Value(0), output_field=IntegerField()
+                ) for column in ('lft', 'rght')
+            })
+        return updated
+
+    def _missing_paths(self):
+        """Return the csv paths which are not stored yet."""
+        paths = {join_path(*path): path for path in self.paths}
+        stored = set()
+
+        lookups = list(paths)
+        for start in range(0, len(lookups), self.path_lookup_size):
+            stored.update(Category.objects.filter(
+                channel=self.channel,
+                path__in=lookups[start:start + self.path_lookup_size]
+            ).values_list('path', flat=True))
+
+        return [path for key, path in paths.items() if key not in stored]
+
+    def _timed(self, phase, func, *args):
+        """Call func storing its duration in the timings of the phase."""
+        start = time.perf_counter()
+        func(*args)
+        self.timings[phase] = time.perf_counter() - start
+
+    @staticmethod
+    def _walk(roots):
+        """Yield the nodes of the given subtrees in tree (preorder) order."""
+        for root in roots:
+            stack = [root]
+            while stack:
+                node = stack.pop()
+                yield node
+                stack.extend(reversed(node.children.values()))
+
+    @staticmethod
+    def _number(root, tree_id, lft=1, level=0):
+        """Compute the mptt columns of a subtree in a single iterative pass.
+
+        Returns the rght of the root.
+        """
+        counter = lft
+        root.tree_id, root.lft, root.level = tree_id, counter, level
+        stack = [(root, iter(root.children.values()))]
+
+        while stack:
+            counter += 1
+            node, children = stack[-1]
+            child = next(children, None)
+            if child is None:
+                node.rght = counter
+                stack.pop()
+            else:
+                child.tree_id, child.lft = tree_id, counter
+                child.level = node.level + 1
+                stack.append((child, iter(child.children.values())))
+        return root.rght
+
+
+class CsvStream:
+    """Stream the lines of a csv file in batches of a fixed size.
+
+    The byte offset and row number after the last yielded batch are kept in
+    the offset and row attributes, a new stream created with them continues
+    right after that batch.
+
+    Usage:
+        stream = CsvStream(filename, batch_size=1000)
+        for lines in stream:
+            BulkImporter(channel).run(lines)
+            stream.offset, stream.row
+    """
+
+    def __init__(self, filename, batch_size=1000, offset=0, row=0):
+        """Store the file and the position where the stream starts."""
+        self.filename = filename
+        self.batch_size = batch_size
+        self.offset = offset
+        self.row = row
+
+    def __iter__(self):
+        """Yield lists of at most batch_size csv lines as dicts."""
+        with open(self.filename, 'rb') as csv_file:
+            header = csv_file.readline()
+            fieldnames = next(csv.reader([header.decode('utf-8-sig')]))
+
+            self.offset = max(self.offset, len(header))
+            csv_file.seek(self.offset)
+
+            batch = []
+            lines = csv.DictReader(self._decode(csv_file), fieldnames)
+            for line in lines:
+                batch.append(line)
+                if len(batch) == self.batch_size:
+                    self.row += len(batch)
+                    yield batch
+                    batch = []
+
+            if batch:
+                self.row += len(batch)
+                yield batch
+
+    def _decode(self, csv_file):
+        """Yield the decoded lines of the file, counting the bytes read."""
+        for line in csv_file:
+            self.offset += len(line)
+            yield line.decode('utf-8')
+
+
+def import_stream(channel, filename, batch_size=1000, resume=False):
+    """Import a csv file committing every batch_size lines.
+
+    Each batch is imported by a BulkImporter inside its own transaction,
+    along with the ImportCheckpoint of the file. When resume is True, the
+    import continues after the last committed batch.
+
+    Yields each BulkImporter after its batch is committed.
+    """
+    checkpoint, created = ImportCheckpoint.objects.get_or_create(
+        channel=channel,
+        source=os.path.abspath(filename)
+    )
+    if not resume:
+        checkpoint.offset = checkpoint.row = 0
+
+    stream = CsvStream(filename, batch_size, checkpoint.offset, checkpoint.row)
+    for lines in stream:
+        with transaction.atomic():
+            importer = BulkImporter(channel).run(lines)
+            checkpoint.offset, checkpoint.row = stream.offset, stream.row
+            checkpoint.save()
+        yield importer
+
+    checkpoint.delete()
+
+
+def init_worker():
+    """Prepare a worker process to import channels.
+
+    Connections inherited from the parent process are closed, so each
+    worker opens its own database connection.
+    """
+    django.setup()
+    connections.close_all()
+
+
+def import_channel(channel_name, filename, batch_size=1000):
+    """Stream the csv file into the channel, returning a summary.
+
+    Errors are reported in the summary instead of raised, so a broken file
+    does not stop nor roll back the import of other channels.
+    """
+    summary = {
+        'channel': channel_name,
+        'file': filename,
+        'lines': 0,
+        'inserted': 0,
+        'seconds': 0,
+        'error': None
+    }
+    start = time.perf_counter()
+
+    try:
+        channel = get_channel(channel_name)
+        for importer in import_stream(channel, filename, batch_size):
+            summary['lines'] += importer.lines
+            summary['inserted'] += importer.inserted
+        write_snapshot(channel)
+    except (DatabaseError, OSError, ValueError, csv.Error) as error:
+        summary['error'] = str(error)
+
+    summary['seconds'] = time.perf_counter() - start
+    return summary
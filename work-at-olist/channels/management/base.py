@@ -0,0 +1,50 @@
+"""Base class of the commands run on some or all of the channels."""
+
+from channels.models import Channel
+from django.core.management import BaseCommand, CommandError
+
+
+class ChannelCommand(BaseCommand):
+    """Base class of the commands run on each of the given channels.
+
+    Subclasses implement handle_channel, whose result is printed after the
+    reference of each channel.
+    """
+
+    def add_arguments(self, parser):
+        """Define command options along with the parser."""
+        parser.add_argument(
+            'references',
+            nargs='*',
+            help='References of the channels, all channels by default.'
+        )
+
+    def handle(self, **options):
+        """Handle each channel and print its result."""
+        for channel in self.get_channels(options.get('references')):
+            self.stdout.write('{reference}: {result}'.format(
+                reference=channel.reference,
+                result=self.handle_channel(channel)
+            ))
+
+    def handle_channel(self, channel):
+        """Return the result of the command for the channel."""
+        raise NotImplementedError(
+            'subclasses of ChannelCommand must provide a handle_channel() '
+            'method'
+        )
+
+    @staticmethod
+    def get_channels(references):
+        """Return the channels of the references, all channels if empty."""
+        channels = Channel.objects.order_by('reference')
+        if not references:
+            return channels
+
+        channels = channels.filter(reference__in=references)
+        missing = set(references) - {channel.reference for channel in channels}
+        if missing:
+            raise CommandError('Channels not found: {}.'.format(
+                ', '.join(sorted(missing))
+            ))
+        return channels
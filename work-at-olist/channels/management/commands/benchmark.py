@@ -0,0 +1,152 @@
+"""Benchmark command.
+
+This command measures the importer and the API on a synthetic catalogue,
+using a new test database, so the data of the project is not touched.
+
+The results are printed as JSON, or written to --output, and compared with
+the results of a previous run given by --baseline: the command fails when
+a timing grows more than --threshold or a query count grows at all.
+The load test serves --clients concurrent slow clients with a single
+threaded WSGI server and with uvicorn running the ASGI handler. With
+--keys, as many rows are inserted with random and with time-ordered ids
+into scratch SQLite tables.
+
+"""
+
+import json
+
+from channels.benchmark import (
+    compare, IMPORT_MODES, run_benchmark, uvicorn
+)
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (
+    setup_test_environment, teardown_test_environment
+)
+
+
+class Command(BaseCommand):
+    """Base class for the benchmark command.
+
+    Run the benchmarks and check them against a baseline.
+    """
+
+    def add_arguments(self, parser):
+        """Define command options along with the parser."""
+        parser.add_argument(
+            '--size',
+            type=int,
+            default=1000,
+            help='Number of lines of the synthetic csv.'
+        )
+        parser.add_argument(
+            '--depth',
+            type=int,
+            default=4,
+            help='Number of levels of each category tree.'
+        )
+        parser.add_argument(
+            '--fanout',
+            type=int,
+            default=5,
+            help='Number of children of each category.'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=10,
+            help='Number of requests measured for each endpoint.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of lines committed at once by the stream import.'
+        )
+        parser.add_argument(
+            '--modes',
+            default=','.join(IMPORT_MODES),
+            help='Comma separated importcategories modes to measure.'
+        )
+        parser.add_argument(
+            '--clients',
+            type=int,
+            default=20,
+            help='Number of concurrent slow clients of the load test, '
+                 '0 to skip it.'
+        )
+        parser.add_argument(
+            '--keys',
+            type=int,
+            default=0,
+            help='Number of rows inserted with random and with '
+                 'time-ordered ids, 0 to skip it.'
+        )
+        parser.add_argument(
+            '--output',
+            help='Filename of the JSON results.'
+        )
+        parser.add_argument(
+            '--baseline',
+            help='Filename of the JSON results to compare with.'
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=0.2,
+            help='Relative growth of a timing counted as a regression.'
+        )
+
+    def handle(self, **options):
+        """Run the benchmarks in a test database and report regressions."""
+        modes = tuple(filter(None, options.get('modes').split(',')))
+        unknown = set(modes) - set(IMPORT_MODES)
+        if not modes or unknown:
+            raise CommandError('Unknown modes: {}.'.format(
+                ', '.join(sorted(unknown)) or options.get('modes')
+            ))
+
+        if options.get('clients') and uvicorn is None:
+            raise CommandError(
+                'The load test requires uvicorn, run with --clients 0 '
+                'to skip it.'
+            )
+
+        baseline = None
+        if options.get('baseline'):
+            with open(options.get('baseline')) as baseline_file:
+                baseline = json.load(baseline_file)
+
+        setup_test_environment()
+        database = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            results = run_benchmark(
+                options.get('size'), options.get('depth'),
+                options.get('fanout'), options.get('repeat'),
+                options.get('batch_size'), modes, options.get('clients'),
+                options.get('keys')
+            )
+        finally:
+            connection.creation.destroy_test_db(database, verbosity=0)
+            teardown_test_environment()
+
+        output = json.dumps(results, indent=4)
+        if options.get('output'):
+            with open(options.get('output'), 'w') as output_file:
+                output_file.write(output)
+        else:
+            self.stdout.write(output)
+
+        if baseline is not None:
+            try:
+                regressions = compare(
+                    results, baseline, options.get('threshold')
+                )
+            except ValueError as error:
+                raise CommandError(error)
+            if regressions:
+                raise CommandError('Regressions found:\n{}'.format(
+                    '\n'.join(regressions)
+                ))
+            self.stdout.write('No regressions found.')
@@ -0,0 +1,45 @@
+"""Export categories command.
+
+This command writes the categories of a channel to a csv file, in the
+format read by importcategories, or to the standard output.
+
+"""
+
+from channels.exporter import export_lines
+from channels.models import Channel
+from django.core.management import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    """Base class for the exportcategories command.
+
+    Stream the paths of the categories of a channel as a CSV.
+    """
+
+    def add_arguments(self, parser):
+        """Define command options along with the parser."""
+        parser.add_argument(
+            'channel_name',
+            help='Name of the channel. e.g: Amazon.'
+        )
+        parser.add_argument(
+            'csv_file',
+            nargs='?',
+            help='Filename of the CSV, the standard output by default.'
+        )
+
+    def handle(self, **options):
+        """Write the path of each category of the channel."""
+        channel_name = options.get('channel_name')
+        channel = Channel.objects.filter(name=channel_name).first()
+        if channel is None:
+            raise CommandError('Channel not found: {}'.format(channel_name))
+
+        if options.get('csv_file') is None:
+            for line in export_lines(channel):
+                self.stdout.write(line, ending='')
+            return
+
+        with open(options.get('csv_file'), 'w', encoding='utf-8',
+                  newline='') as csv_file:
+            csv_file.writelines(export_lines(channel))
@@ -2,14 +2,26 @@
 
 This command imports categories from a csv file.
 
+With --bulk the whole file is imported by the set-based BulkImporter,
+with --stream the file is imported in batches of --batch-size lines, each
+one committed on its own, with --sync the file is the full catalogue and
+only its difference from the previous sync is applied, deleting missing
+categories, otherwise each path segment is created with get_or_create.
+The snapshot of the channel tree is written after each import that
+changed it.
+
 """
 
 import csv
+import os
 
-from channels.models import Category, Channel
-from django.core.management import BaseCommand
-from django.db import transaction
-from django.utils.text import slugify
+from channels.importer import BulkImporter, get_channel, import_stream
+from channels.models import Category
+from channels.snapshots import write_snapshot
+from channels.sync import sync_channel
+from channels.utils import join_path
+from django.core.management import BaseCommand, CommandError
+from django.db import DatabaseError, transaction
 
 
 class Command(BaseCommand):
@@ -26,27 +38,134 @@ class Command(BaseCommand):
         )
         parser.add_argument(
             'csv_file',
-            type=lambda file: csv.DictReader(open(file)),
             help='Filename of the CSV with the categories.'
         )
+        parser.add_argument(
+            '--bulk',
+            action='store_true',
+            help='Import using bulk inserts instead of one query per row.'
+        )
+        parser.add_argument(
+            '--stream',
+            action='store_true',
+            help='Import in batches, committing after each one.'
+        )
+        parser.add_argument(
+            '--sync',
+            action='store_true',
+            help='Apply only the changes since the previous sync, '
+                 'deleting the categories missing from the file.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of lines committed at once by --stream.'
+        )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='Continue an interrupted --stream import.'
+        )
 
-    @transaction.atomic
     def handle(self, **options):
         """Create the channel entry and its categories."""
         channel_name = options.get('channel_name')
         csv_file = options.get('csv_file')
 
-        channel, created = Channel.objects.get_or_create(
-            reference=slugify(channel_name),
-            defaults={'name': channel_name}
-        )
+        if not os.path.isfile(csv_file):
+            raise CommandError('File not found: {}'.format(csv_file))
+
+        channel = get_channel(channel_name)
+        generation = channel.generation
+
+        if options.get('sync'):
+            self.sync_import(channel, csv_file)
+        elif options.get('stream'):
+            self.stream_import(
+                channel, csv_file,
+                options.get('batch_size'), options.get('resume')
+            )
+        else:
+            with open(csv_file, encoding='utf-8') as lines, \
+                    transaction.atomic():
+                if options.get('bulk'):
+                    self.bulk_import(channel, csv.DictReader(lines))
+                else:
+                    self.default_import(channel, csv.DictReader(lines))
 
+        channel.refresh_from_db(fields=['generation'])
+        if channel.generation != generation:
+            write_snapshot(channel)
+
+    @staticmethod
+    def default_import(channel, csv_file):
+        """Create each category of each line with get_or_create."""
         for line in csv_file:
             parent_node = None
+            names = list(map(str.strip, line.get('Category', '').split('/')))
+
+            if Category.objects.filter(
+                channel=channel, path=join_path(*names)
+            ).exists():
+                continue
 
-            for name in map(str.strip, line.get('Category', '').split('/')):
+            for name in names:
                 parent_node, created = Category.objects.get_or_create(
                     channel=channel,
                     parent=parent_node,
                     name=name
                 )
+
+    def bulk_import(self, channel, csv_file):
+        """Import the csv with the BulkImporter and report its statistics."""
+        importer = BulkImporter(channel).run(csv_file)
+
+        self.stdout.write(
+            'Inserted {inserted} and renumbered {updated} categories.'.format(
+                inserted=importer.inserted, updated=importer.updated
+            )
+        )
+        for phase, duration in importer.timings.items():
+            self.stdout.write('{phase}: {duration:.3f}s'.format(
+                phase=phase, duration=duration
+            ))
+
+    def sync_import(self, channel, filename):
+        """Apply the difference of the csv and report its statistics."""
+        sync = sync_channel(channel, filename)
+
+        self.stdout.write(
+            'Added {added}, removed {removed} and renamed {renamed} '
+            'categories.'.format(
+                added=sync.added, removed=sync.removed, renamed=sync.renamed
+            )
+        )
+        for phase, duration in sync.timings.items():
+            self.stdout.write('{phase}: {duration:.3f}s'.format(
+                phase=phase, duration=duration
+            ))
+        return sync
+
+    def stream_import(self, channel, filename, batch_size, resume):
+        """Import the csv in batches, reporting each committed batch."""
+        inserted = 0
+        importers = import_stream(channel, filename, batch_size, resume)
+
+        try:
+            for importer in importers:
+                inserted += importer.inserted
+                self.stdout.write(
+                    'Committed {lines} lines, inserted {inserted}.'.format(
+                        lines=importer.lines, inserted=importer.inserted
+                    )
+                )
+        except (DatabaseError, csv.Error, ValueError) as error:
+            raise CommandError(
+                'Import stopped after {inserted} inserted categories: '
+                '{error}. Run again with --resume to continue.'.format(
+                    inserted=inserted, error=error
+                )
+            )
+
+        self.stdout.write('Inserted {} categories.'.format(inserted))
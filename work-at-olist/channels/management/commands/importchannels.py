@@ -0,0 +1,105 @@
+"""Import channels command.
+
+This command imports the categories of many channels at the same time,
+reading the channel/csv pairs from a manifest file.
+
+The manifest is a csv file with the columns "Channel" and "File", relative
+file names are resolved from the directory of the manifest. Concurrent
+imports need a database that supports concurrent writers (PostgreSQL).
+
+"""
+
+import csv
+from multiprocessing import cpu_count, Pool
+import os
+
+from channels.importer import import_channel, init_worker
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, connections
+
+
+class Command(BaseCommand):
+    """Base class for the importchannels command.
+
+    Spread the imports of a manifest across a pool of worker processes.
+    """
+
+    def add_arguments(self, parser):
+        """Define command options along with the parser."""
+        parser.add_argument(
+            'manifest',
+            help='Filename of the CSV with the Channel and File columns.'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=cpu_count(),
+            help='Number of channels imported at the same time.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of lines committed at once for each channel.'
+        )
+
+    def handle(self, **options):
+        """Import each channel of the manifest and print a summary."""
+        jobs = [
+            (channel_name, filename, options.get('batch_size'))
+            for channel_name, filename in self.read_manifest(
+                options.get('manifest')
+            )
+        ]
+        workers = min(options.get('workers'), len(jobs))
+
+        if workers > 1 and connection.vendor == 'sqlite':
+            self.stdout.write('SQLite does not support concurrent writers, '
+                              'importing one channel at a time.')
+            workers = 1
+
+        if workers > 1:
+            # Forked workers must not share the connection of this process
+            connections.close_all()
+            with Pool(workers, initializer=init_worker) as pool:
+                summaries = pool.starmap(import_channel, jobs)
+        else:
+            summaries = [import_channel(*job) for job in jobs]
+
+        for summary in summaries:
+            self.stdout.write(
+                '{channel}: {lines} lines, {inserted} inserted in '
+                '{seconds:.3f}s{status}'.format(
+                    status=' FAILED: {}'.format(summary['error'])
+                    if summary['error'] else '',
+                    **summary
+                )
+            )
+
+        failed = [summary['channel'] for summary in summaries
+                  if summary['error']]
+        if failed:
+            raise CommandError(
+                'Failed to import: {}.'.format(', '.join(failed))
+            )
+
+    @staticmethod
+    def read_manifest(manifest):
+        """Return the (channel name, csv file) pairs of the manifest."""
+        if not os.path.isfile(manifest):
+            raise CommandError('File not found: {}'.format(manifest))
+
+        directory = os.path.dirname(os.path.abspath(manifest))
+        with open(manifest) as lines:
+            pairs = [
+                (line.get('Channel', '').strip(),
+                 os.path.join(directory, line.get('File', '').strip()))
+                for line in csv.DictReader(lines)
+            ]
+
+        names = [name for name, filename in pairs]
+        if not all(names) or len(set(names)) != len(names):
+            raise CommandError(
+                'Each manifest line needs a unique channel name.'
+            )
+        return pairs
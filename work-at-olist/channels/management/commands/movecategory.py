@@ -0,0 +1,76 @@
+"""Move category command.
+
+This command moves a category, with all its descendants, under another
+category or to the roots of its channel, and renames it. The paths and
+references of the whole subtree are updated in a single transaction.
+
+"""
+
+from channels.models import Category
+from channels.reorganize import move_category
+from django.core.management import BaseCommand, CommandError
+from django.db import IntegrityError
+
+
+class Command(BaseCommand):
+    """Base class for the movecategory command.
+
+    Move or rename a category subtree and report the changed rows.
+    """
+
+    def add_arguments(self, parser):
+        """Define command options along with the parser."""
+        parser.add_argument(
+            'reference',
+            help='Reference of the category. e.g: amazon-games.'
+        )
+        target = parser.add_mutually_exclusive_group()
+        target.add_argument(
+            '--parent',
+            help='Reference of the new parent of the category.'
+        )
+        target.add_argument(
+            '--root',
+            action='store_true',
+            help='Move the category to the roots of its channel.'
+        )
+        parser.add_argument(
+            '--name',
+            help='New name of the category.'
+        )
+
+    def handle(self, **options):
+        """Move the category and print how many rows changed."""
+        category = self.get_category(options.get('reference'))
+        if options.get('root'):
+            parent = None
+        elif options.get('parent'):
+            parent = self.get_category(options.get('parent'))
+        elif options.get('name'):
+            parent = category.parent
+        else:
+            raise CommandError('Give a new --parent, --root or a new --name.')
+
+        try:
+            reorganized = move_category(
+                category, parent, name=options.get('name')
+            )
+        except (ValueError, IntegrityError) as error:
+            raise CommandError(error)
+
+        self.stdout.write(
+            '{path}: {categories} categories, {references} references and '
+            '{paths} paths updated.'.format(
+                path=category.path, **reorganized._asdict()
+            )
+        )
+
+    @staticmethod
+    def get_category(reference):
+        """Return the category of the reference, with its channel."""
+        category = Category.objects.select_related('channel').filter(
+            reference=reference
+        ).first()
+        if category is None:
+            raise CommandError('Category not found: {}'.format(reference))
+        return category
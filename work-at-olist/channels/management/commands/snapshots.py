@@ -0,0 +1,25 @@
+"""Snapshots command.
+
+This command writes the compressed snapshots of the category trees, of
+the given channels or of all of them. Snapshots are also written after each
+import and whenever an outdated one is requested, this command is useful
+to warm them up after a deploy or a change to SNAPSHOT_DIRECTORY.
+
+"""
+
+from channels.management.base import ChannelCommand
+from channels.snapshots import write_snapshot
+
+
+class Command(ChannelCommand):
+    """Base class for the snapshots command.
+
+    Render the tree of each channel to its snapshot files.
+    """
+
+    def handle_channel(self, channel):
+        """Write the snapshot of the channel, returning its digest."""
+        snapshot = write_snapshot(channel)
+        return '{digest} ({encodings})'.format(
+            digest=snapshot.digest, encodings=', '.join(snapshot.encodings)
+        )
@@ -0,0 +1,22 @@
+"""Tree index command.
+
+This command writes the tree index files of the given channels or of all
+of them. With TREE_INDEX enabled the files are also written whenever a
+channel changes, this command is useful to write them the first time or
+after a change to TREE_INDEX_DIRECTORY.
+
+"""
+
+from channels.management.base import ChannelCommand
+from channels.treeindex import write_tree_index
+
+
+class Command(ChannelCommand):
+    """Base class for the treeindex command.
+
+    Write the tree of each channel to its index file.
+    """
+
+    def handle_channel(self, channel):
+        """Write the index of the channel, returning its file."""
+        return write_tree_index(channel)
@@ -0,0 +1,166 @@
+"""Histograms of the cost of each request, shared by all worker processes.
+
+Each process keeps its histograms in memory and writes them, at most every
+METRICS_FLUSH_INTERVAL seconds, to its own file in METRICS_DIRECTORY.
+Reading the metrics merges the files of every process, so the numbers of
+all gunicorn workers are reported together. The histograms are cumulative,
+files of stopped workers are kept so the totals never go back, clean the
+directory on deploys to reset them.
+
+Usage:
+    registry.observe('CategoryViewSet', 'list', 'queries', 3)
+    with timer(request, 'serializer_seconds'):
+        data = serializer.data
+    registry.render()
+"""
+
+from bisect import bisect_left
+from collections import OrderedDict
+from contextlib import contextmanager
+import json
+import os
+import threading
+import time
+
+from django.conf import settings
+
+
+SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Name: (help text, upper bounds of the buckets)
+METRICS = OrderedDict([
+    ('request_seconds', ('Wall time of the requests.', SECONDS)),
+    ('db_seconds', ('Time spent running database queries.', SECONDS)),
+    ('serializer_seconds', (
+        'Time spent building the serialized data.', SECONDS
+    )),
+    ('queries', (
+        'Number of database queries.', (1, 2, 3, 5, 10, 25, 50, 100, 250)
+    )),
+    ('response_bytes', (
+        'Size of the response bodies.', (1e3, 1e4, 1e5, 1e6, 1e7)
+    )),
+])
+
+PREFIX = 'workatolist_'
+
+
+class Registry:
+    """The histograms of a process, keyed by view, action and metric.
+
+    Each histogram is a list with the count of each bucket, including the
+    +Inf bucket, followed by the sum and the count of the observed values.
+    """
+
+    def __init__(self):
+        """Start with empty histograms."""
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.flushed = time.monotonic()
+
+    def reset(self):
+        """Forget the histograms of this process."""
+        with self.lock:
+            self.histograms = {}
+
+    def observe(self, view, action, metric, value):
+        """Add a value to the histogram of the view action."""
+        buckets = METRICS[metric][1]
+        key = '\t'.join((view, action, metric))
+
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [0] * (len(buckets) + 3)
+            histogram[bisect_left(buckets, value)] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+        if time.monotonic() - self.flushed >= \
+                settings.METRICS_FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        """Write the histograms of this process to its file, atomically."""
+        directory = settings.METRICS_DIRECTORY
+        os.makedirs(directory, exist_ok=True)
+        filename = os.path.join(directory, '{}.json'.format(os.getpid()))
+
+        with self.lock:
+            data = json.dumps(self.histograms)
+            self.flushed = time.monotonic()
+
+        with open(filename + '.tmp', 'w') as metrics_file:
+            metrics_file.write(data)
+        os.replace(filename + '.tmp', filename)
+
+    def collect(self):
+        """Return the histograms of all processes added together."""
+        self.flush()
+        directory = settings.METRICS_DIRECTORY
+        merged = {}
+
+        for filename in sorted(os.listdir(directory)):
+            if not filename.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(directory, filename)) as metrics_file:
+                    histograms = json.load(metrics_file)
+            except (OSError, ValueError):
+                continue
+
+            for key, histogram in histograms.items():
+                total = merged.setdefault(key, [0] * len(histogram))
+                for index, value in enumerate(histogram):
+                    total[index] += value
+        return merged
+
+    def render(self):
+        """Return the merged histograms in the Prometheus text format."""
+        histograms = self.collect()
+        lines = []
+
+        for metric, (description, buckets) in METRICS.items():
+            name = PREFIX + metric
+            lines.append('# HELP {} {}'.format(name, description))
+            lines.append('# TYPE {} histogram'.format(name))
+
+            for key in sorted(histograms):
+                view, action, key_metric = key.split('\t')
+                if key_metric != metric:
+                    continue
+                histogram = histograms[key]
+                labels = 'view="{}",action="{}"'.format(view, action)
+
+                cumulative = 0
+                for bound, count in zip(buckets + ('+Inf',), histogram):
+                    cumulative += count
+                    lines.append('{name}_bucket{{{labels},le="{le}"}} '
+                                 '{count}'.format(name=name, labels=labels,
+                                                  le=bound, count=cumulative))
+                lines.append('{}_sum{{{}}} {}'.format(
+                    name, labels, histogram[-2]
+                ))
+                lines.append('{}_count{{{}}} {}'.format(
+                    name, labels, histogram[-1]
+                ))
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+@contextmanager
+def timer(request, metric):
+    """Add the duration of the block to a metric of the request.
+
+    Requests not instrumented by the MetricsMiddleware are ignored.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics = getattr(request, 'metrics', None)
+        if metrics is not None:
+            metrics[metric] = metrics.get(metric, 0) + \
+                time.perf_counter() - start
@@ -0,0 +1,160 @@
+"""Middleware recording the cost of each request."""
+
+from collections import deque
+import logging
+import time
+
+from channels.metrics import registry
+from django.conf import settings
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.db.backends.utils import CursorWrapper
+from django.utils.deprecation import MiddlewareMixin
+
+
+logger = logging.getLogger(__name__)
+
+# Number of statements kept per request for the log of slow requests
+SLOW_REQUEST_STATEMENTS = 100
+
+
+class CountingCursorWrapper(CursorWrapper):
+    """Cursor adding the queries it runs to a QueryCounter."""
+
+    def __init__(self, cursor, db, counter):
+        """Wrap the cursor of the connection db."""
+        super(CountingCursorWrapper, self).__init__(cursor, db)
+        self.counter = counter
+
+    def execute(self, sql, params=None):
+        """Run the query, counting it along with its duration."""
+        start = time.perf_counter()
+        try:
+            return super(CountingCursorWrapper, self).execute(sql, params)
+        finally:
+            self.counter.add(sql, time.perf_counter() - start)
+
+    def executemany(self, sql, param_list):
+        """Run the query for each parameters, counting it once."""
+        start = time.perf_counter()
+        try:
+            return super(CountingCursorWrapper, self).executemany(
+                sql, param_list
+            )
+        finally:
+            self.counter.add(sql, time.perf_counter() - start)
+
+
+class QueryCounter:
+    """Number and duration of the queries run on a connection.
+
+    While started, the cursors created by the connection are wrapped by a
+    CountingCursorWrapper, around the debug cursor when queries are logged
+    as well. Only the last SLOW_REQUEST_STATEMENTS statements are kept,
+    without their parameters, for the log of slow requests.
+    """
+
+    factories = ('make_cursor', 'make_debug_cursor')
+
+    def __init__(self, connection):
+        """Count the queries of the connection, once started."""
+        self.connection = connection
+        self.count = 0
+        self.seconds = 0
+        self.statements = deque(maxlen=SLOW_REQUEST_STATEMENTS)
+        self.replaced = {}
+
+    def add(self, sql, seconds):
+        """Count a query which took seconds to run."""
+        self.count += 1
+        self.seconds += seconds
+        self.statements.append((seconds, sql))
+
+    def start(self):
+        """Wrap the cursors created by the connection from now on."""
+        for name in self.factories:
+            self.replaced[name] = self.connection.__dict__.get(name)
+            setattr(self.connection, name, self.wrap(
+                getattr(self.connection, name)
+            ))
+
+    def stop(self):
+        """Let the connection create its own cursors again."""
+        for name, factory in self.replaced.items():
+            if factory is None:
+                delattr(self.connection, name)
+            else:
+                setattr(self.connection, name, factory)
+        self.replaced.clear()
+
+    def wrap(self, factory):
+        """Return the cursor factory wrapping the cursors of factory."""
+        def make_cursor(cursor):
+            return CountingCursorWrapper(
+                factory(cursor), self.connection, self
+            )
+        return make_cursor
+
+
+class MetricsMiddleware(MiddlewareMixin):
+    """Record the wall time, queries and response size of each request.
+
+    The metrics are recorded per view and action, e.g. CategoryViewSet and
+    list, in the histograms of channels.metrics. Queries are counted by a
+    QueryCounter, which neither formats nor stores their SQL as DEBUG
+    does, requests slower than SLOW_REQUEST_SECONDS are logged along with
+    their last statements.
+    """
+
+    def process_request(self, request):
+        """Start the clock and the counter of the queries."""
+        request.metrics = {'serializer_seconds': 0}
+        request.metrics_start = time.perf_counter()
+        request.metrics_queries = QueryCounter(connections[DEFAULT_DB_ALIAS])
+        request.metrics_queries.start()
+
+    @staticmethod
+    def process_view(request, view_func, view_args, view_kwargs):
+        """Store the name of the view and of the action of the request."""
+        actions = getattr(view_func, 'actions', None) or {}
+        request.metrics_view = getattr(
+            getattr(view_func, 'cls', view_func), '__name__', 'view'
+        )
+        request.metrics_action = actions.get(
+            request.method.lower(), request.method.lower()
+        )
+
+    def process_response(self, request, response):
+        """Record the metrics of the request and log slow requests."""
+        if not hasattr(request, 'metrics_start'):
+            return response
+
+        seconds = time.perf_counter() - request.metrics_start
+        queries = request.metrics_queries
+        queries.stop()
+
+        view = getattr(request, 'metrics_view', 'unresolved')
+        action = getattr(request, 'metrics_action', request.method.lower())
+
+        registry.observe(view, action, 'request_seconds', seconds)
+        registry.observe(view, action, 'db_seconds', queries.seconds)
+        registry.observe(view, action, 'queries', queries.count)
+        registry.observe(
+            view, action, 'serializer_seconds',
+            request.metrics['serializer_seconds']
+        )
+        if not response.streaming:
+            registry.observe(
+                view, action, 'response_bytes', len(response.content)
+            )
+
+        if seconds >= settings.SLOW_REQUEST_SECONDS:
+            logger.warning(
+                'Slow request %s %s: %.3fs, %d queries in %.3fs\n%s',
+                request.method, request.get_full_path(), seconds,
+                queries.count, queries.seconds,
+                '\n'.join(
+                    '[{:.3f}s] {}'.format(*query)
+                    for query in queries.statements
+                )
+            )
+        return response
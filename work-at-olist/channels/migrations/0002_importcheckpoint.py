@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.6 on 2026-10-18 18:04
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('channels', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=1024, verbose_name='Source')),
+                ('offset', models.BigIntegerField(default=0, verbose_name='Offset')),
+                ('row', models.PositiveIntegerField(default=0, verbose_name='Row')),
+                ('time_modified', models.DateTimeField(auto_now=True, verbose_name='Time modified')),
+                ('channel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='channels.Channel', verbose_name='Channel')),
+            ],
+            options={
+                'verbose_name': 'Import checkpoint',
+                'verbose_name_plural': 'Import checkpoints',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='importcheckpoint',
+            unique_together=set([('channel', 'source')]),
+        ),
+    ]
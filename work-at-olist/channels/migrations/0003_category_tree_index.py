@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.6 on 2026-10-18 18:09
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('channels', '0002_importcheckpoint'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='category',
+            index_together=set([('tree_id', 'lft')]),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.6 on 2026-10-18 18:10
+from __future__ import unicode_literals
+
+from channels.utils import bulk_update, join_path
+from django.db import migrations, models
+
+
+def fill_paths(apps, schema_editor):
+    """Build the path of the existing categories in tree order."""
+    Category = apps.get_model('channels', 'Category')
+    paths = {}
+    categories = Category.objects.order_by('tree_id', 'lft').values_list(
+        'pk', 'parent_id', 'name'
+    )
+    for pk, parent_id, name in categories:
+        paths[pk] = join_path(paths.get(parent_id, ''), name)
+
+    bulk_update(
+        Category.objects, {pk: (path,) for pk, path in paths.items()}, ('path',)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('channels', '0003_category_tree_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(default='', editable=False, max_length=1024, verbose_name='Path'),
+        ),
+        migrations.RunPython(fill_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.6 on 2026-10-18 18:11
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('channels', '0005_category_path_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='channel',
+            name='generation',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Generation'),
+        ),
+    ]
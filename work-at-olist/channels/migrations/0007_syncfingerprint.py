@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.6 on 2026-10-18 18:20
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('channels', '0006_channel_generation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncFingerprint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=40, verbose_name='Digest')),
+                ('generation', models.PositiveIntegerField(default=0, verbose_name='Generation')),
+                ('paths', models.BinaryField(verbose_name='Paths')),
+                ('time_modified', models.DateTimeField(auto_now=True, verbose_name='Time modified')),
+                ('channel', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='fingerprint', to='channels.Channel', verbose_name='Channel')),
+            ],
+            options={
+                'verbose_name': 'Sync fingerprint',
+                'verbose_name_plural': 'Sync fingerprints',
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.6 on 2026-10-18 18:25
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('channels', '0008_category_name_trigram_index'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='category',
+            index_together=set([('tree_id', 'lft'), ('channel', 'tree_id', 'lft'), ('channel', 'level', 'tree_id', 'lft')]),
+        ),
+    ]
@@ -4,15 +4,31 @@ All models of this module should be defined here.
 
 """
 
-import uuid
-
-from channels.utils import Attrgetter
-from django.db import models
+from collections import namedtuple
+from functools import lru_cache
+
+from channels.utils import (
+    bulk_update, cached_attrgetter, join_path, uuid7
+)
+from django.db import models, transaction
+from django.db.models import CharField, F, Max, TextField, Value
+from django.db.models.functions import Concat, Length, Substr
+from django.dispatch import Signal
+from django.utils import timezone
 from django.utils.text import slugify
 from django.utils.translation import ugettext_lazy as _
 from mptt.models import MPTTModel, TreeForeignKey
 
 
+# Sent with the channel_id whenever a channel or its categories change
+channel_changed = Signal(providing_args=['channel_id'])
+
+# Compiled slug settings of a model, see BaseModel.get_slug_spec
+SlugSpec = namedtuple(
+    'SlugSpec', ('attname', 'max_length', 'values', 'prefix', 'relations')
+)
+
+
 class BaseModel(models.Model):
     """Abstract model for Channel and Category classes.
 
@@ -29,7 +45,7 @@ class BaseModel(models.Model):
     * slug_prefix - the field name which will be the prefix of the slug.
     """
 
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     time_created = models.DateTimeField(_('Time created'), auto_now_add=True)
     time_modified = models.DateTimeField(_('Time modified'), auto_now=True)
     reference = models.SlugField(_('Reference'), max_length=100, unique=True)
@@ -37,16 +53,46 @@ class BaseModel(models.Model):
     # noinspection PyUnresolvedReferences
     def save(self, *args, **kwargs):
         """Auto creates an slugified reference based on another attribute."""
-        value_field_name = getattr(self, 'value_field_name', ('name',))
-        slug_field_name = getattr(self, 'slug_field_name', 'reference')
-        slug_prefix = getattr(self, 'slug_prefix', None)
+        spec = self.get_slug_spec()
+        setattr(self, spec.attname, self.build_slug(spec))
+        super(BaseModel, self).save(*args, **kwargs)
+
+    @classmethod
+    @lru_cache(maxsize=None)
+    def get_slug_spec(cls):
+        """Return the slug field and getters of the model, built once."""
+        value_field_name = getattr(cls, 'value_field_name', ('name',))
+        slug_field_name = getattr(cls, 'slug_field_name', 'reference')
+        slug_prefix = getattr(cls, 'slug_prefix', None)
 
         # Retrieve the field where the slug will be stored
-        slug_field = self._meta.get_field(slug_field_name)
-        slug_len = slug_field.max_length
+        slug_field = cls._meta.get_field(slug_field_name)
+
+        # Relations whose attributes are part of the slug
+        names = value_field_name + ((slug_prefix,) if slug_prefix else ())
+        relations = []
+        for name in names:
+            field = cls._meta.get_field(name.split('.')[0])
+            if field.many_to_one and field not in relations:
+                relations.append(field)
+
+        return SlugSpec(
+            attname=slug_field.attname,
+            max_length=slug_field.max_length,
+            values=cached_attrgetter(*value_field_name, model=cls),
+            prefix=(
+                cached_attrgetter(slug_prefix, model=cls)
+                if slug_prefix else None
+            ),
+            relations=tuple(relations)
+        )
+
+    def build_slug(self, spec=None):
+        """Return the slug of the instance, without setting it."""
+        spec = spec or self.get_slug_spec()
 
         # Get list of fields to create slug
-        slug_list = Attrgetter(*value_field_name)(self)
+        slug_list = spec.values(self)
 
         if isinstance(slug_list, tuple):
             slug_list = list(map(str, slug_list))
@@ -54,8 +100,8 @@ class BaseModel(models.Model):
             slug_list = [slug_list]
 
         # Add prefix if it hasnt been added already
-        if slug_prefix:
-            slug_prefix_value = Attrgetter(slug_prefix)(self)
+        if spec.prefix:
+            slug_prefix_value = spec.prefix(self)
             if not slug_list[0].startswith(slug_prefix_value):
                 slug_list.insert(0, slug_prefix_value + '-')
 
@@ -63,10 +109,36 @@ class BaseModel(models.Model):
 
         # Slugify the field
         slug = slugify('-'.join(slug_list))
+        return slug[:spec.max_length]
 
-        # Set the slug attribute value
-        setattr(self, slug_field.attname, slug[:slug_len])
-        super(BaseModel, self).save(*args, **kwargs)
+    @classmethod
+    def build_references(cls, instances):
+        """Set the slug of many unsaved instances in memory.
+
+        Relations used by the slug which are not loaded yet are fetched with
+        a single query per relation for all instances, instances given as
+        relations are used as they are, so parents must come before their
+        children.
+        """
+        spec = cls.get_slug_spec()
+
+        for field in spec.relations:
+            missing = [
+                instance for instance in instances
+                if getattr(instance, field.attname) is not None
+                if not hasattr(instance, field.get_cache_name())
+            ]
+            related = field.related_model._base_manager.in_bulk({
+                getattr(instance, field.attname) for instance in missing
+            })
+            for instance in missing:
+                setattr(instance, field.name, related.get(
+                    getattr(instance, field.attname)
+                ))
+
+        for instance in instances:
+            setattr(instance, spec.attname, instance.build_slug(spec))
+        return instances
 
     class Meta:
         """Django meta class options.
@@ -85,6 +157,11 @@ class Channel(BaseModel):
     """
 
     name = models.CharField(_('Name'), max_length=256, unique=True)
+
+    # Incremented whenever the channel or its categories change
+    generation = models.PositiveIntegerField(
+        _('Generation'), default=0, editable=False
+    )
     objects = models.Manager()
 
     class Meta:
@@ -102,6 +179,59 @@ class Channel(BaseModel):
         """Return the name attribute as representation."""
         return self.name
 
+    def save(self, *args, **kwargs):
+        """Increment the generation of an existing channel.
+
+        The increment is done by the database, since the instance may have
+        been loaded before other changes incremented it.
+        """
+        adding = self._state.adding
+        if not adding:
+            self.generation = F('generation') + \
+                Channel.generation_increment(self.pk)
+        super(Channel, self).save(*args, **kwargs)
+        if not adding:
+            self.refresh_from_db(fields=['generation'])
+        channel_changed.send(sender=Channel, channel_id=self.pk)
+
+    @staticmethod
+    def generation_increment(channel_id):
+        """Return 1 for the first change of a channel in a transaction.
+
+        The following changes in the same transaction return 0, since they
+        are committed along with the first increment. The first one marks
+        the channel with a transaction.on_commit callback, which is dropped
+        along with the increment if its savepoint rolls back.
+        """
+        connection = transaction.get_connection()
+        if not connection.in_atomic_block:
+            return 1
+        if any(getattr(callback, 'generation_of', None) == channel_id
+               for savepoints, callback in connection.run_on_commit):
+            return 0
+
+        def incremented():
+            """Mark the generation of the channel as incremented."""
+        incremented.generation_of = channel_id
+        transaction.on_commit(incremented)
+        return 1
+
+    @staticmethod
+    def bump_generation(channel_id):
+        """Increment the generation of a channel after its categories change.
+
+        Must be called by the code changing categories without the model
+        save/delete methods, e.g. bulk inserts or queryset updates. It is
+        incremented once per transaction, see generation_increment.
+        """
+        if not Channel.generation_increment(channel_id):
+            return
+        Channel.objects.filter(pk=channel_id).update(
+            generation=F('generation') + 1,
+            time_modified=timezone.now()
+        )
+        channel_changed.send(sender=Channel, channel_id=channel_id)
+
 
 class Category(BaseModel, MPTTModel):
     """Category model.
@@ -126,6 +256,9 @@ class Category(BaseModel, MPTTModel):
         verbose_name=_('Parent')
     )
 
+    # Names of all ancestors and the category, e.g. "Books / Fantasy"
+    path = models.TextField(_('Path'), default='', editable=False)
+
     slug_prefix = 'channel.reference'
     value_field_name = ('parent.reference', 'name',)
 
@@ -139,8 +272,217 @@ class Category(BaseModel, MPTTModel):
         ordering = ['name']
         verbose_name = _('Category')
         verbose_name_plural = _('Categories')
-        unique_together = ('channel', 'name', 'parent',)
+        unique_together = (
+            ('channel', 'name', 'parent',),
+            ('path', 'channel',),
+        )
+        index_together = (
+            ('tree_id', 'lft'),
+            ('channel', 'tree_id', 'lft'),
+            ('channel', 'level', 'tree_id', 'lft'),
+        )
 
     def __str__(self):
         """Return the name attribute as representation."""
         return self.name
+
+    def save(self, *args, **kwargs):
+        """Keep the path of the category and its descendants up to date."""
+        self.load_parent()
+        stored_path = None
+        if not self._state.adding:
+            # The instance may not know of descendants added since loaded
+            stored_path = Category.objects.filter(pk=self.pk).values_list(
+                'path', flat=True
+            ).first()
+
+        self.path = self.build_path()
+        super(Category, self).save(*args, **kwargs)
+
+        if stored_path is not None:
+            self.replace_descendants_path(stored_path)
+        Channel.bump_generation(self.channel_id)
+
+    def delete(self, *args, **kwargs):
+        """Delete the category and its descendants."""
+        super(Category, self).delete(*args, **kwargs)
+        Channel.bump_generation(self.channel_id)
+
+    def move_to(self, target, position='first-child'):
+        """Move the category in the tree, updating the paths of the subtree."""
+        stored_path = self.path
+        super(Category, self).move_to(target, position)
+
+        self.path = self.build_path()
+        Category.objects.filter(pk=self.pk).update(path=self.path)
+        self.replace_descendants_path(stored_path)
+        Channel.bump_generation(self.channel_id)
+
+    def load_parent(self):
+        """Load the parent along with its channel in a single query.
+
+        Both are needed by the reference and the path, the channel of the
+        parent is reused when the channel is not loaded yet.
+        """
+        if self.parent_id is None or \
+                hasattr(self, Category.parent.field.get_cache_name()):
+            return
+
+        self.parent = Category.objects.select_related('channel').get(
+            pk=self.parent_id
+        )
+        if self.parent.channel_id == self.channel_id and \
+                not hasattr(self, Category.channel.field.get_cache_name()):
+            self.channel = self.parent.channel
+
+    def build_path(self):
+        """Return the path of the category from the path of its parent."""
+        return join_path(self.parent.path if self.parent else '', self.name)
+
+    def update_descendants_reference(self):
+        """Rebuild the references of all descendants from this category.
+
+        References are built from the reference of the parent, which this
+        category may have changed. Descendants are loaded with one query
+        and only the changed references are written, with CASE updates.
+
+        Returns the number of updated categories.
+        """
+        categories = {self.pk: self}
+        descendants = list(self.get_descendants().order_by('lft'))
+        for descendant in descendants:
+            descendant.parent = categories[descendant.parent_id]
+            descendant.channel = self.channel
+            categories[descendant.pk] = descendant
+
+        stored = {
+            descendant.pk: descendant.reference for descendant in descendants
+        }
+        Category.build_references(descendants)
+        return bulk_update(Category.objects, {
+            descendant.pk: (descendant.reference,)
+            for descendant in descendants
+            if descendant.reference != stored[descendant.pk]
+        }, ('reference',))
+
+    def replace_descendants_reference(self, stored_reference):
+        """Replace the stored reference prefix of all descendants.
+
+        The references of the descendants start with the reference of this
+        category and a hyphen, so the prefix is replaced with one UPDATE.
+        When a reference may be truncated, or slugify would merge the hyphen
+        with the prefix, they are rebuilt with update_descendants_reference
+        instead, as are the descendants not starting with the prefix.
+
+        Returns the number of updated categories.
+        """
+        count = self.get_descendant_count()
+        if stored_reference == self.reference or not count:
+            return 0
+
+        max_length = self._meta.get_field('reference').max_length
+        descendants = self.get_descendants()
+        longest = descendants.aggregate(
+            longest=Max(Length('reference'))
+        )['longest']
+        if stored_reference.endswith('-') or self.reference.endswith('-') \
+                or longest >= max_length or longest + len(self.reference) \
+                - len(stored_reference) >= max_length:
+            return self.update_descendants_reference()
+
+        prefix = stored_reference + '-'
+        updated = descendants.filter(reference__startswith=prefix).update(
+            reference=Concat(
+                Value(self.reference + '-'),
+                Substr('reference', len(prefix) + 1),
+                output_field=CharField()
+            )
+        )
+        if updated < count:
+            updated += self.update_descendants_reference()
+        return updated
+
+    def replace_descendants_path(self, stored_path):
+        """Replace the stored path prefix of all descendants with one query.
+
+        Descendants are found by the tree columns, read again from the
+        database, since the instance may not know of descendants added
+        after it was loaded.
+
+        Returns the number of updated categories.
+        """
+        if stored_path is None or stored_path == self.path:
+            return 0
+
+        self.refresh_from_db(fields=['tree_id', 'lft', 'rght', 'level'])
+        return self.get_descendants().update(path=Concat(
+            Value(self.path),
+            Substr('path', len(stored_path) + 1),
+            output_field=TextField()
+        ))
+
+
+class ImportCheckpoint(models.Model):
+    """Position of a streaming import of categories.
+
+    Stores the byte offset and row number of the last committed batch of a
+    csv file, so an interrupted import can continue where it stopped.
+    """
+
+    channel = models.ForeignKey(
+        Channel,
+        related_name='checkpoints',
+        verbose_name=_('Channel')
+    )
+    source = models.CharField(_('Source'), max_length=1024)
+    offset = models.BigIntegerField(_('Offset'), default=0)
+    row = models.PositiveIntegerField(_('Row'), default=0)
+    time_modified = models.DateTimeField(_('Time modified'), auto_now=True)
+
+    class Meta:
+        """Django meta class options.
+
+        For more options:
+        https://docs.djangoproject.com/en/1.11/ref/models/options/
+        """
+
+        verbose_name = _('Import checkpoint')
+        verbose_name_plural = _('Import checkpoints')
+        unique_together = ('channel', 'source',)
+
+    def __str__(self):
+        """Return the source and row as representation."""
+        return '{source}:{row}'.format(source=self.source, row=self.row)
+
+
+class SyncFingerprint(models.Model):
+    """Paths of the last feed synchronized into a channel.
+
+    The paths are stored zlib compressed, one per line, along with their
+    digest and the generation of the channel after the sync, so the next
+    sync can tell the feed and the categories did not change since.
+    """
+
+    channel = models.OneToOneField(
+        Channel,
+        related_name='fingerprint',
+        verbose_name=_('Channel')
+    )
+    digest = models.CharField(_('Digest'), max_length=40)
+    generation = models.PositiveIntegerField(_('Generation'), default=0)
+    paths = models.BinaryField(_('Paths'))
+    time_modified = models.DateTimeField(_('Time modified'), auto_now=True)
+
+    class Meta:
+        """Django meta class options.
+
+        For more options:
+        https://docs.djangoproject.com/en/1.11/ref/models/options/
+        """
+
+        verbose_name = _('Sync fingerprint')
+        verbose_name_plural = _('Sync fingerprints')
+
+    def __str__(self):
+        """Return the digest as representation."""
+        return self.digest
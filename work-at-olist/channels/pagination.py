@@ -0,0 +1,187 @@
+"""Pagination classes for the Channel and Category API."""
+
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from hashlib import md5
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import _positive_int, BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination using the values of a unique ordering as keys.
+
+    Each page is selected with a WHERE clause over the ordering fields,
+    e.g. (tree_id, lft) > (3, 10), instead of an OFFSET, so deep pages cost
+    the same as the first one. The total count is cached for
+    PAGINATION_COUNT_TIMEOUT seconds, so it is not computed on every page.
+    Views may set count_version to a version of the paginated data, so the
+    cached count is discarded as soon as the data changes.
+
+    The ordering fields must be ascending and unique as a whole.
+
+    Usage: /api/v1/category/?limit=100&cursor=<next cursor>
+    """
+
+    ordering = ()
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'limit'
+    max_page_size = 1000
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+    count_version = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """Return the page of the queryset after the cursor position."""
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.count = self.get_count(queryset)
+        page_size = self.get_page_size(request)
+        reverse, position = self.decode_cursor(request, queryset.model)
+
+        if position is not None:
+            queryset = queryset.filter(self.keyset_filter(position, reverse))
+        queryset = queryset.order_by(*[
+            '-' + field if reverse else field for field in self.ordering
+        ])
+
+        results = list(queryset[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+
+        self.first = self.get_position(results[0]) if results else None
+        self.last = self.get_position(results[-1]) if results else None
+        return results
+
+    def get_paginated_response(self, data):
+        """Return the count, the next and previous urls and the results."""
+        return Response(OrderedDict([
+            ('count', self.count),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data)
+        ]))
+
+    def get_page_size(self, request):
+        """Return the page size requested by the client, if any."""
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def get_count(self, queryset):
+        """Return the number of rows of the queryset, cached by its SQL."""
+        key = 'channels:count:{version}:{query}'.format(
+            version=self.count_version,
+            query=md5(str(queryset.query).encode('utf-8')).hexdigest()
+        )
+        return cache.get_or_set(
+            key, queryset.count, settings.PAGINATION_COUNT_TIMEOUT
+        )
+
+    def get_position(self, instance):
+        """Return the values of the ordering fields of an instance.
+
+        Rows of .values() querysets are read by key.
+        """
+        if isinstance(instance, dict):
+            return [instance[field] for field in self.ordering]
+        return [getattr(instance, field) for field in self.ordering]
+
+    def keyset_filter(self, position, reverse):
+        """Build the filter selecting the rows after (or before) position."""
+        lookup = '__lt' if reverse else '__gt'
+        keyset = Q()
+        for index, field in enumerate(self.ordering):
+            keyset |= Q(
+                **dict(zip(self.ordering[:index], position[:index])),
+                **{field + lookup: position[index]}
+            )
+        return keyset
+
+    def get_next_link(self):
+        """Return the url of the page after the last result."""
+        if not self.has_next or self.last is None:
+            return None
+        return self.encode_cursor(False, self.last)
+
+    def get_previous_link(self):
+        """Return the url of the page before the first result."""
+        if not self.has_previous:
+            return None
+        if self.first is None:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(True, self.first)
+
+    def encode_cursor(self, reverse, position):
+        """Return the url of the page starting at the position."""
+        cursor = urlsafe_b64encode(
+            json.dumps([reverse, position]).encode('utf-8')
+        ).decode('ascii')
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, cursor
+        )
+
+    def decode_cursor(self, request, model):
+        """Return the direction and position of the cursor of the request.
+
+        The values of the position are converted by the ordering fields of
+        the model, so a forged cursor is rejected instead of failing the
+        query.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return False, None
+
+        try:
+            reverse, position = json.loads(
+                urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8')
+            )
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if not isinstance(position, list) or \
+                len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        try:
+            position = [
+                model._meta.get_field(field).to_python(value)
+                for field, value in zip(self.ordering, position)
+            ]
+        except ValidationError:
+            raise NotFound(self.invalid_cursor_message)
+        if any(isinstance(value, (dict, list, type(None)))
+               for value in position):
+            raise NotFound(self.invalid_cursor_message)
+        return bool(reverse), position
+
+
+class ChannelPagination(KeysetPagination):
+    """Paginate channels by their unique name."""
+
+    ordering = ('name',)
+
+
+class CategoryPagination(KeysetPagination):
+    """Paginate categories in tree order, using the mptt columns."""
+
+    ordering = ('tree_id', 'lft')
@@ -0,0 +1,59 @@
+"""Renderers for the Channel and Category API."""
+
+import csv
+from io import StringIO
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Render results as newline delimited JSON, one object per line.
+
+    Paginated responses render one line for each of their results, so
+    clients can process the rows while they are received.
+
+    For more info: http://ndjson.org/
+    """
+
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """Render the results of the data, or the data itself, as lines."""
+        if data is None:
+            return b''
+        if isinstance(data, dict):
+            data = data.get('results', [data])
+        return b''.join(map(self.encode, data))
+
+    @staticmethod
+    def encode(row):
+        """Encode a single row as a line of compact JSON."""
+        return json.dumps(
+            row, ensure_ascii=False, separators=(',', ':')
+        ).encode('utf-8') + b'\n'
+
+
+class CSVRenderer(BaseRenderer):
+    """Render a dict, e.g. an error, or a list of dicts as CSV.
+
+    Exports are streamed by the views, this renderer is used by the other
+    responses of requests accepting only CSV.
+    """
+
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """Render the keys of the first row as header, then the rows."""
+        if not data:
+            return b''
+        rows = [data] if isinstance(data, dict) else data
+        output = StringIO()
+        writer = csv.DictWriter(output, list(rows[0]), lineterminator='\n')
+        writer.writeheader()
+        writer.writerows(rows)
+        return output.getvalue().encode('utf-8')
@@ -0,0 +1,79 @@
+"""Moves and renames of whole category subtrees.
+
+Moving a category, or renaming it, changes the path and the reference of
+all its descendants. Instead of saving them one by one, the category is
+saved once, which moves the subtree with the set-based updates of mptt,
+and the paths and references of the descendants are replaced by their new
+prefix with one UPDATE each, all inside a single transaction.
+
+Usage:
+    move_category(games, parent=entertainment)
+    move_category(games, parent=None, name='Video Games')
+    rename_category(books, 'Livros')
+"""
+
+from collections import namedtuple
+
+from channels.models import Category
+from channels.utils import join_path
+from django.db import transaction
+
+
+# Number of rows changed by a move or a rename
+Reorganized = namedtuple('Reorganized', ('categories', 'references', 'paths'))
+
+
+def move_category(category, parent, name=None):
+    """Move the category and its subtree under parent, renaming it if given.
+
+    A parent of None makes the category a root. Raises ValueError when the
+    parent is in another channel or in the subtree itself, or when it
+    already has a child with the same name.
+
+    Returns the Reorganized counts: the categories of the subtree, and how
+    many of them had their reference and their path changed.
+    """
+    with transaction.atomic():
+        category.refresh_from_db()
+        if parent is not None:
+            parent.refresh_from_db()
+            if parent.channel_id != category.channel_id:
+                raise ValueError('The parent belongs to another channel.')
+            if parent.is_descendant_of(category, include_self=True):
+                raise ValueError(
+                    'A category cannot be moved under its own subtree.'
+                )
+
+        name = category.name if name is None else name
+        siblings = Category.objects.filter(
+            channel=category.channel_id, parent=parent, name=name
+        ).exclude(pk=category.pk)
+        if siblings.exists():
+            raise ValueError('There is already a category named {}.'.format(
+                join_path(parent.path if parent else '', name)
+            ))
+
+        stored_reference, stored_path = category.reference, category.path
+        parent_id = parent.pk if parent is not None else None
+        if parent_id != category.parent_id and name != category.name:
+            # mptt moves the row before it is saved, and the old name may be
+            # taken by a child of the new parent
+            Category.objects.filter(pk=category.pk).update(
+                name=category.pk.hex
+            )
+        category.name = name
+        category.parent = parent
+        category.save()
+
+        count = category.get_descendant_count()
+        references = category.replace_descendants_reference(stored_reference)
+        return Reorganized(
+            categories=count + 1,
+            references=references + (category.reference != stored_reference),
+            paths=(count + 1) if category.path != stored_path else 0
+        )
+
+
+def rename_category(category, name):
+    """Rename the category, updating its subtree, see move_category."""
+    return move_category(category, category.parent, name)
@@ -0,0 +1,184 @@
+"""Prefix and word search over the category names of a channel.
+
+Two kinds of queries are supported, both case insensitive:
+
+* prefix: the name starts with the term, e.g. "sci" finds "Science Fiction";
+* search: any word of the name starts with the term, e.g. "fic" finds
+  "Science Fiction" and "Fiction Fantastic".
+
+Results are ranked by name prefix matches first, then by name and path.
+
+On PostgreSQL the queries run in the database, backed by a pg_trgm GIN
+index on UPPER(name) (migration 0008). Other databases use a NameIndex
+kept in memory for each channel, rebuilt in the background whenever the
+generation of the channel changes.
+"""
+
+from bisect import bisect_left
+from collections import OrderedDict
+import heapq
+from itertools import islice
+import threading
+
+from channels.models import Category
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.functions import Lower
+
+
+# Number of channels whose NameIndex is kept in memory
+INDEX_CACHE_SIZE = 16
+
+# Fields of each search result
+FIELDS = ('reference', 'name', 'path')
+
+
+class NameIndex:
+    """Sorted arrays of the lowercase names and words of the categories.
+
+    A prefix lookup is a binary search for the range of keys starting with
+    the term, like walking a trie but without a Python object per node.
+    """
+
+    def __init__(self, categories):
+        """Index the (reference, name, path) tuples of the categories."""
+        self.categories = list(categories)
+        names, words = [], []
+
+        for index, (reference, name, path) in enumerate(self.categories):
+            lower = name.lower()
+            names.append((lower, path, index))
+            for position, char in enumerate(lower):
+                if position and lower[position - 1] == ' ' and char != ' ':
+                    words.append((lower[position:], path, index))
+
+        # Sorted by name and path, names are also sorted by rank
+        self.names = sorted(names)
+        self.words = sorted(words)
+
+    @staticmethod
+    def matches(keys, term):
+        """Yield the indexes of the categories whose key starts with term."""
+        for position in range(bisect_left(keys, (term,)), len(keys)):
+            key, path, index = keys[position]
+            if not key.startswith(term):
+                break
+            yield index
+
+    def find(self, term, prefix=True, limit=10):
+        """Return the top categories matching the term."""
+        term = term.lower()
+        found = list(islice(self.matches(self.names, term), limit))
+
+        if not prefix and len(found) < limit:
+            seen = set(found)
+            found.extend(heapq.nsmallest(
+                limit - len(found),
+                {index for index in self.matches(self.words, term)
+                 if index not in seen},
+                key=lambda index: (
+                    self.categories[index][1].lower(),
+                    self.categories[index][2]
+                )
+            ))
+
+        return [dict(zip(FIELDS, self.categories[index])) for index in found]
+
+
+class NameIndexCache:
+    """The NameIndex of the most recently searched channels.
+
+    When the generation of a channel changes, the index of the previous
+    generation keeps being served while the new one is built by another
+    thread, unless SEARCH_STALE_INDEX is disabled. Only the first search of
+    a channel waits for its index.
+    """
+
+    def __init__(self, size=INDEX_CACHE_SIZE):
+        """Start with no indexes."""
+        self.size = size
+        self.lock = threading.Lock()
+        self.indexes = OrderedDict()
+        self.building = {}
+
+    def get(self, channel):
+        """Return the index of the channel, possibly of an older generation."""
+        key = (channel.pk, channel.generation)
+        with self.lock:
+            cached = [cached for cached in self.indexes
+                      if cached[0] == channel.pk]
+            if cached:
+                self.indexes.move_to_end(cached[0])
+                stale = self.indexes[cached[0]]
+                if cached[0][1] >= channel.generation:
+                    return stale
+                if settings.SEARCH_STALE_INDEX:
+                    if key not in self.building:
+                        self.building[key] = threading.Thread(
+                            target=self.rebuild, args=(channel, key)
+                        )
+                        self.building[key].start()
+                    return stale
+
+        index = self.build(channel)
+        self.store(key, index)
+        return index
+
+    @staticmethod
+    def build(channel):
+        """Return a new index of the categories of the channel."""
+        return NameIndex(Category.objects.filter(
+            channel=channel
+        ).values_list(*FIELDS).iterator())
+
+    def rebuild(self, channel, key):
+        """Build and store the index of the channel from another thread."""
+        try:
+            self.store(key, self.build(channel))
+        finally:
+            # The connection of this thread is not closed by any request
+            connection.close()
+            with self.lock:
+                del self.building[key]
+
+    def store(self, key, index):
+        """Keep the index, replacing the ones of older generations."""
+        with self.lock:
+            cached = [cached for cached in self.indexes
+                      if cached[0] == key[0]]
+            if any(generation > key[1] for pk, generation in cached):
+                return
+            for stale in cached:
+                del self.indexes[stale]
+            self.indexes[key] = index
+            while len(self.indexes) > self.size:
+                self.indexes.popitem(last=False)
+
+    def wait(self):
+        """Wait for the indexes being built, e.g. before a shutdown."""
+        with self.lock:
+            threads = list(self.building.values())
+        for thread in threads:
+            thread.join()
+
+
+indexes = NameIndexCache()
+
+
+def search_categories(channel, term, prefix=True, limit=10):
+    """Return the top categories of the channel matching the term."""
+    if connection.vendor != 'postgresql':
+        return indexes.get(channel).find(term, prefix, limit)
+
+    matches = Q(name__istartswith=term)
+    if not prefix:
+        matches |= Q(name__icontains=' ' + term)
+
+    return list(Category.objects.filter(matches, channel=channel).annotate(
+        rank=Case(
+            When(name__istartswith=term, then=Value(0)),
+            default=Value(1),
+            output_field=IntegerField()
+        )
+    ).order_by('rank', Lower('name'), 'path').values(*FIELDS)[:limit])
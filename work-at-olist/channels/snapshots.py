@@ -0,0 +1,153 @@
+"""Compressed JSON snapshots of the category tree of each channel.
+
+A snapshot is the whole tree of a channel rendered once to JSON and stored
+compressed in SNAPSHOT_DIRECTORY, so full-tree requests are answered by
+sending a file instead of querying and serializing every category.
+
+Files are stored in a directory named after the id of the channel, and
+named after the generation of the channel and the hash of their content,
+e.g. 01a15053a3947278.../12-3f2a9c0e5b7d1a64.json.gz. A change to the tree
+bumps the generation, so outdated snapshots are never served and are
+replaced on the next write, and deleting a channel removes its directory.
+Brotli (.br) files are also written when the optional brotli package is
+installed.
+
+Usage:
+    snapshot = get_snapshot(channel)
+    snapshot.digest, snapshot.path('gzip')
+"""
+
+from collections import namedtuple, OrderedDict
+import glob
+import gzip
+from hashlib import sha1
+import json
+import os
+import shutil
+import tempfile
+
+from channels.models import Category
+from channels.utils import nest_descendants
+from django.conf import settings
+from django.db import transaction
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+
+# File extension of each Content-Encoding, in order of preference
+ENCODINGS = OrderedDict([('br', '.br'), ('gzip', '.gz')])
+
+
+class Snapshot(namedtuple('Snapshot', ('name', 'digest', 'encodings'))):
+    """The files of a snapshot, one for each available encoding."""
+
+    __slots__ = ()
+
+    def path(self, encoding):
+        """Return the file name of the snapshot compressed by encoding."""
+        return self.name + ENCODINGS[encoding]
+
+    def open(self, accept_encoding):
+        """Open the best file for the Accept-Encoding request header.
+
+        Returns the file and its encoding, clients accepting none of the
+        encodings get the gzip file decompressed while it is read.
+        """
+        accepted = {
+            token.split(';')[0].strip().lower()
+            for token in accept_encoding.split(',')
+        }
+        for encoding in self.encodings:
+            if encoding in accepted:
+                return open(self.path(encoding), 'rb'), encoding
+        return gzip.open(self.path('gzip')), None
+
+
+def snapshot_directory(channel_id):
+    """Return the directory of the snapshots of a channel."""
+    return os.path.join(settings.SNAPSHOT_DIRECTORY, channel_id.hex)
+
+
+def render_tree(channel):
+    """Return the JSON of the channel and its nested categories."""
+    categories = Category.objects.filter(channel=channel).order_by(
+        'tree_id', 'lft'
+    ).values_list('pk', 'parent_id', 'name', 'reference').iterator()
+
+    return json.dumps(OrderedDict([
+        ('name', channel.name),
+        ('reference', channel.reference),
+        ('categories', nest_descendants(None, categories))
+    ]), separators=(',', ':')).encode('utf-8')
+
+
+def compress(data, encoding):
+    """Return the data compressed with the Content-Encoding."""
+    if encoding == 'br':
+        return brotli.compress(data)
+    return gzip.compress(data, compresslevel=9)
+
+
+def write_snapshot(channel):
+    """Render the tree of the channel to its compressed snapshot files.
+
+    Files are written to temporary names and then renamed, so requests
+    never see a partial snapshot. Snapshots of older generations of the
+    channel are removed.
+    """
+    channel.refresh_from_db(fields=['generation'])
+    directory = snapshot_directory(channel.pk)
+    os.makedirs(directory, exist_ok=True)
+    data = render_tree(channel)
+    digest = sha1(data).hexdigest()[:16]
+    name = os.path.join(directory, '{generation}-{digest}.json'.format(
+        generation=channel.generation, digest=digest
+    ))
+
+    encodings = [
+        encoding for encoding in ENCODINGS
+        if encoding != 'br' or brotli is not None
+    ]
+    for encoding in encodings:
+        descriptor, temporary = tempfile.mkstemp(dir=directory)
+        with os.fdopen(descriptor, 'wb') as snapshot_file:
+            snapshot_file.write(compress(data, encoding))
+        os.replace(temporary, name + ENCODINGS[encoding])
+
+    for stale in os.listdir(directory):
+        generation = stale.split('-', 1)[0]
+        if generation.isdigit() and int(generation) < channel.generation:
+            os.remove(os.path.join(directory, stale))
+
+    return Snapshot(name, digest, encodings)
+
+
+def get_snapshot(channel):
+    """Return the snapshot of the channel, writing it if it is outdated."""
+    pattern = os.path.join(
+        glob.escape(snapshot_directory(channel.pk)),
+        '{}-*.json.gz'.format(channel.generation)
+    )
+    for name in glob.glob(pattern):
+        name = name[:-len(ENCODINGS['gzip'])]
+        return Snapshot(
+            name,
+            name[:-len('.json')].rsplit('-', 1)[1],
+            [encoding for encoding, extension in ENCODINGS.items()
+             if os.path.exists(name + extension)]
+        )
+    return write_snapshot(channel)
+
+
+def schedule_snapshot_removal(sender, instance, **kwargs):
+    """Remove the snapshots of a deleted channel once the delete commits.
+
+    Connected to the post_delete signal of Channel when the app is ready.
+    """
+    directory = snapshot_directory(instance.pk)
+    transaction.on_commit(
+        lambda: shutil.rmtree(directory, ignore_errors=True)
+    )
@@ -0,0 +1,187 @@
+"""Incremental synchronization of the categories of a channel with a feed.
+
+A feed is a csv with the full catalogue of a channel. Instead of checking
+every row against the database, the paths of the feed are compared in
+memory with the paths of the previous feed, kept in the SyncFingerprint of
+the channel, and only the difference is written:
+
+* renamed categories, a removed and an added category with the same parent
+  and the same descendants, are renamed in place, keeping their ids;
+* removed categories are deleted along with their subtrees;
+* added categories are imported by the BulkImporter.
+
+The fingerprint is only trusted while the generation of the channel is the
+one left by the last sync, otherwise the stored paths are read instead.
+
+"""
+
+from collections import defaultdict, OrderedDict
+import csv
+from hashlib import sha1
+import time
+import zlib
+
+from channels.importer import BulkImporter
+from channels.models import Category, Channel, SyncFingerprint
+from channels.utils import join_path, PATH_SEPARATOR, split_path
+from django.db import transaction
+
+
+def parent_path(path):
+    """Return the path of the parent of a path, '' for roots."""
+    return path.rpartition(PATH_SEPARATOR)[0]
+
+
+def tops(paths):
+    """Return the paths whose parent is not in paths, the subtree roots."""
+    return {path for path in paths if parent_path(path) not in paths}
+
+
+class DeltaSync:
+    """Apply the difference between a feed and the previous one.
+
+    Usage:
+        sync = DeltaSync(channel)
+        sync.run(csv.DictReader(open(filename)))
+        sync.added, sync.removed, sync.renamed, sync.timings
+    """
+
+    def __init__(self, channel):
+        """Start with no changes for the channel."""
+        self.channel = channel
+        self.paths = OrderedDict()
+        self.digest = None
+        self.lines = 0
+        self.added = 0
+        self.removed = 0
+        self.renamed = 0
+        self.timings = OrderedDict()
+
+    def run(self, lines):
+        """Synchronize the channel with the lines of the feed."""
+        self._timed('parse', self.parse, lines)
+        with transaction.atomic():
+            fingerprint = SyncFingerprint.objects.select_for_update().filter(
+                channel=self.channel
+            ).first()
+            self._timed('diff', self.diff, fingerprint)
+            self._timed('write', self.write, fingerprint)
+        return self
+
+    def parse(self, lines):
+        """Read the paths of the feed, along with the paths of ancestors.
+
+        The paths keep the order of the feed, which is the order of the
+        inserted siblings.
+        """
+        for line in lines:
+            self.lines += 1
+            names = split_path(line.get('Category', ''))
+            for index in range(len(names)):
+                self.paths[join_path(*names[:index + 1])] = None
+
+        self.digest = sha1(self.dump(self.paths)).hexdigest()
+
+    def diff(self, fingerprint):
+        """Compute the added, removed and renamed subtrees of the feed."""
+        self.rename, self.delete, self.insert = {}, set(), []
+        generation = Channel.objects.filter(pk=self.channel.pk).values_list(
+            'generation', flat=True
+        ).get()
+
+        if fingerprint is not None and fingerprint.generation == generation:
+            if fingerprint.digest == self.digest:
+                return
+            stored = set(self.load(fingerprint.paths))
+        else:
+            stored = set(Category.objects.filter(
+                channel=self.channel
+            ).values_list('path', flat=True))
+
+        added = self.paths.keys() - stored
+        removed = stored - self.paths.keys()
+        self.insert = [path for path in self.paths if path in added]
+
+        # Subtrees moved under the same parent with the same descendants
+        candidates = defaultdict(lambda: ([], []))
+        for index, paths in enumerate((removed, added)):
+            for top, descendants in self._subtrees(paths).items():
+                key = (parent_path(top), frozenset(descendants))
+                candidates[key][index].append(top)
+
+        for old, new in candidates.values():
+            if len(old) == 1 and len(new) == 1:
+                self.rename[old[0]] = new[0]
+        self.delete = tops(removed) - set(self.rename)
+
+    def write(self, fingerprint):
+        """Rename, delete and insert the categories, then the fingerprint."""
+        if fingerprint is not None and fingerprint.digest == self.digest \
+                and not (self.rename or self.delete or self.insert):
+            return
+
+        categories = Category.objects.filter(channel=self.channel)
+
+        for old, new in self.rename.items():
+            category = categories.get(path=old)
+            category.name = new.rpartition(PATH_SEPARATOR)[2]
+            category.save()
+            category.update_descendants_reference()
+            self.renamed += 1
+
+        for path in self.delete:
+            category = categories.get(path=path)
+            self.removed += category.get_descendant_count() + 1
+            category.delete()
+
+        if self.insert:
+            importer = BulkImporter(self.channel).run(
+                {'Category': path} for path in self.insert
+            )
+            self.added = importer.inserted
+
+        if fingerprint is None:
+            fingerprint = SyncFingerprint(channel=self.channel)
+        fingerprint.digest = self.digest
+        fingerprint.paths = self.dump(self.paths, compress=True)
+        fingerprint.generation = Channel.objects.filter(
+            pk=self.channel.pk
+        ).values_list('generation', flat=True).get()
+        fingerprint.save()
+
+    @staticmethod
+    def dump(paths, compress=False):
+        """Return the sorted paths as bytes, one per line."""
+        data = '\n'.join(sorted(paths)).encode('utf-8')
+        return zlib.compress(data) if compress else data
+
+    @staticmethod
+    def load(data):
+        """Return the paths stored by dump with compress."""
+        data = zlib.decompress(bytes(data)).decode('utf-8')
+        return data.split('\n') if data else []
+
+    @staticmethod
+    def _subtrees(paths):
+        """Return the descendants of each subtree root, relative to it."""
+        subtrees = {top: [] for top in tops(paths)}
+        for path in paths:
+            names = path.split(PATH_SEPARATOR)
+            for index in range(1, len(names)):
+                descendants = subtrees.get(join_path(*names[:index]))
+                if descendants is not None:
+                    descendants.append(join_path(*names[index:]))
+                    break
+        return subtrees
+
+    def _timed(self, phase, func, *args):
+        """Call func storing its duration in the timings of the phase."""
+        start = time.perf_counter()
+        func(*args)
+        self.timings[phase] = time.perf_counter() - start
+
+
+def sync_channel(channel, filename):
+    """Synchronize the channel with the csv file, returning the DeltaSync."""
+    with open(filename, encoding='utf-8') as lines:
+        return DeltaSync(channel).run(csv.DictReader(lines))
@@ -3,3 +3,18 @@
 All tests for the app are defined in this module.
 
 """
+
+from django.db import connection
+
+
+def commit():
+    """Run and clear the on-commit callbacks of the test transaction.
+
+    TestCase runs each test in a transaction which never commits, so its
+    changes are seen as a single transaction, e.g. the generation of a
+    channel is only incremented once. A test calls this as if the changes
+    made so far were committed.
+    """
+    callbacks, connection.run_on_commit = connection.run_on_commit, []
+    for savepoints, callback in callbacks:
+        callback()
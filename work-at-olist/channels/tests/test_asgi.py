@@ -0,0 +1,131 @@
+"""Test file for the ASGI handler."""
+
+import asyncio
+import json
+from unittest import skipIf
+
+from channels.asgi import ASGIHandler
+from channels.benchmark import load_test, uvicorn
+from channels.models import Category, Channel
+from django.core.handlers.wsgi import WSGIHandler
+from django.test import TransactionTestCase
+
+
+class ASGIHandlerTest(TransactionTestCase):
+    """Tests for the requests served by the ASGI handler.
+
+    Views run in other threads, with their own database connections, so
+    the data of the tests has to be committed.
+    """
+
+    def setUp(self):
+        """Create a channel and a category, and the handler."""
+        channel = Channel.objects.create(name='Amazon')
+        Category.objects.create(channel=channel, name='Books')
+        self.handler = ASGIHandler(WSGIHandler(), threads=2)
+        self.addCleanup(self.handler.executor.shutdown)
+
+    def request(self, scope, messages):
+        """Send the messages to the handler, returning the sent ones."""
+        sent = []
+
+        async def receive():
+            """Return the next message of the client."""
+            return messages.pop(0)
+
+        async def send(message):
+            """Store the message sent to the client."""
+            sent.append(message)
+
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        loop.run_until_complete(self.handler(scope, receive, send))
+        return sent
+
+    def test_request(self):
+        """Test if the query string, headers and body reach the view."""
+        start, *bodies = self.request({
+            'type': 'http',
+            'method': 'GET',
+            'path': '/api/v1/category/',
+            'query_string': b'channel=amazon',
+            'headers': [(b'accept', b'application/json')]
+        }, [
+            {'type': 'http.request', 'body': b'', 'more_body': True},
+            {'type': 'http.request', 'body': b''}
+        ])
+
+        self.assertEqual(start['status'], 200)
+        self.assertIn(
+            (b'Content-Type', b'application/json'), start['headers']
+        )
+        self.assertFalse(bodies[-1].get('more_body', False))
+        content = json.loads(
+            b''.join(body['body'] for body in bodies).decode('utf-8')
+        )
+        self.assertEqual(content.get('count'), 1)
+
+    def test_streaming(self):
+        """Test if streaming responses are sent as they are read."""
+        start, *bodies = self.request({
+            'type': 'http',
+            'method': 'GET',
+            'path': '/api/v1/channel/amazon/export/'
+        }, [{'type': 'http.request', 'body': b''}])
+
+        self.assertEqual(start['status'], 200)
+        self.assertEqual(
+            [body['body'] for body in bodies],
+            [b'Category\n', b'Books\n', b'']
+        )
+        self.assertTrue(all(body['more_body'] for body in bodies[:-1]))
+
+    def test_broken_stream(self):
+        """Test if the thread stops reading when the client is gone."""
+        sent = []
+
+        async def receive():
+            """Return the request of the client."""
+            return {'type': 'http.request', 'body': b''}
+
+        async def send(message):
+            """Fail after the first chunk, as for a closed connection."""
+            if len(sent) == 2:
+                raise ConnectionResetError()
+            sent.append(message)
+
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        with self.assertRaises(ConnectionResetError):
+            loop.run_until_complete(self.handler({
+                'type': 'http',
+                'method': 'GET',
+                'path': '/api/v1/channel/amazon/export/'
+            }, receive, send))
+        self.handler.executor.shutdown()
+        self.assertEqual(sent[1]['body'], b'Category\n')
+
+    def test_disconnect(self):
+        """Test if nothing is sent to clients gone before the body."""
+        self.assertEqual(self.request(
+            {'type': 'http', 'method': 'POST', 'path': '/api/v1/category/'},
+            [{'type': 'http.disconnect'}]
+        ), [])
+
+    def test_lifespan(self):
+        """Test if the startup and the shutdown are acknowledged."""
+        self.assertEqual(self.request({'type': 'lifespan'}, [
+            {'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}
+        ]), [
+            {'type': 'lifespan.startup.complete'},
+            {'type': 'lifespan.shutdown.complete'}
+        ])
+
+    @skipIf(uvicorn is None, 'uvicorn is not installed')
+    def test_load_test(self):
+        """Test if both servers answer concurrent slow clients."""
+        results = load_test(
+            '/api/v1/channel/amazon/', clients=4, client_delay=0.05
+        )
+        self.assertGreaterEqual(results['sync_seconds'], 0.05)
+        self.assertGreaterEqual(results['async_seconds'], 0.05)
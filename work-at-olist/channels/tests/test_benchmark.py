@@ -0,0 +1,85 @@
+"""Test file for the benchmark suite."""
+
+import csv
+from os.path import join
+from tempfile import TemporaryDirectory
+
+from channels.benchmark import (
+    compare, generate_catalogue, key_benchmark, run_benchmark
+)
+from channels.utils import split_path
+from django.test import TestCase
+
+
+class TestBenchmark(TestCase):
+    """Tests for the catalogue generator and the benchmark results."""
+
+    def test_generate_catalogue(self):
+        """Check if the catalogue has the requested size and shape."""
+        with TemporaryDirectory() as directory:
+            filename = join(directory, 'catalogue.csv')
+            self.assertEqual(generate_catalogue(filename, 50, 3, 3), 50)
+            with open(filename) as csv_file:
+                paths = [
+                    split_path(line['Category'])
+                    for line in csv.DictReader(csv_file)
+                ]
+
+        self.assertEqual(len(paths), 50)
+        self.assertEqual(max(map(len, paths)), 3)
+        # 1 + 3 + 9 categories in each complete tree
+        self.assertEqual(len([path for path in paths if len(path) == 1]), 4)
+
+        seen = set()
+        for path in paths:
+            self.assertIn(tuple(path[:-1]) or None, seen | {None})
+            seen.add(tuple(path))
+
+    def test_run_benchmark(self):
+        """Check if every mode and endpoint is measured."""
+        results = run_benchmark(size=40, depth=3, fanout=3, repeat=2)
+
+        for mode in ('default', 'bulk', 'stream'):
+            self.assertEqual(results['import'][mode]['categories'], 40)
+        self.assertEqual(results['endpoints']['channel-list']['queries'], 3)
+        self.assertEqual(
+            results['endpoints']['category-detail-leaf']['warm_queries'], 1
+        )
+        self.assertEqual(
+            list(results['attrgetter']['root']),
+            ['uncached_seconds', 'python_seconds', 'cached_seconds']
+        )
+        self.assertEqual(results['serializers']['rows'], 40)
+        self.assertEqual(compare(results, results), [])
+
+    def test_key_benchmark(self):
+        """Check if both kinds of ids fill the tables and indexes."""
+        results = key_benchmark(rows=100, batch_size=30)
+        self.assertEqual(list(results), ['uuid4', 'uuid7'])
+        for costs in results.values():
+            self.assertGreater(costs['rows_per_second'], 0)
+            self.assertGreater(costs['parent_index_bytes'], 0)
+
+    def test_compare(self):
+        """Check if grown timings and query counts are regressions."""
+        baseline = {
+            'parameters': {'size': 10},
+            'import': {'bulk': {'seconds': 1.0, 'categories': 10}},
+            'endpoints': {'channel-list': {
+                'queries': 2, 'cold': {'median': 0.0101, 'p95': 0.5}
+            }}
+        }
+        results = {
+            'parameters': {'size': 10},
+            'import': {'bulk': {'seconds': 1.1, 'categories': 20}},
+            'endpoints': {'channel-list': {
+                'queries': 3, 'cold': {'median': 0.0111, 'p95': 0.7}
+            }}
+        }
+
+        self.assertEqual(compare(results, baseline, threshold=0.2), [
+            'endpoints.channel-list.queries: 2 -> 3',
+            'endpoints.channel-list.cold.p95: 0.5 -> 0.7'
+        ])
+        with self.assertRaises(ValueError):
+            compare(results, {'parameters': {'size': 20}})
@@ -0,0 +1,68 @@
+"""Test file for the exportcategories command and endpoint."""
+
+from io import StringIO
+from os.path import join
+from tempfile import TemporaryDirectory
+
+from channels.models import Category
+from django.core.management import call_command, CommandError
+from django.test import TestCase
+from workatolist.settings import BASE_DIR
+
+
+class TestExportCategoriesCommand(TestCase):
+    """Tests for the "exportcategories" command."""
+
+    channel = 'Amazon'
+    csv_file = join(BASE_DIR, 'channels/tests/sample.csv')
+
+    def setUp(self):
+        """Import the sample csv before test cases."""
+        call_command('importcategories', self.channel, self.csv_file)
+
+    def export(self, channel_name):
+        """Return the csv exported by the command."""
+        output = StringIO()
+        call_command('exportcategories', channel_name, stdout=output)
+        return output.getvalue()
+
+    def test_export(self):
+        """Check if the export is the imported csv, in tree order."""
+        with open(self.csv_file) as csv_file:
+            self.assertEqual(self.export(self.channel), csv_file.read())
+
+    def test_round_trip(self):
+        """Check if the exported file imports the same tree."""
+        with TemporaryDirectory() as directory:
+            filename = join(directory, 'export.csv')
+            Category.objects.create(
+                channel=Category.objects.first().channel,
+                name='Jogos, "Ação" e Aventura'
+            )
+            call_command('exportcategories', self.channel, filename)
+            call_command('importcategories', 'Copy', filename, bulk=True,
+                         stdout=StringIO())
+
+        self.assertEqual(self.export('Copy'), self.export(self.channel))
+
+    def test_unknown_channel(self):
+        """Check if unknown channels are not created."""
+        with self.assertRaises(CommandError):
+            self.export('Unknown')
+
+    def test_endpoint(self):
+        """Check if the endpoint streams the same csv in two queries."""
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                '/api/v1/channel/amazon/export/', HTTP_ACCEPT='text/csv'
+            )
+            content = b''.join(response.streaming_content).decode('utf-8')
+
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(content, self.export(self.channel))
+
+        response = self.client.get(
+            '/api/v1/channel/unknown/export/', HTTP_ACCEPT='text/csv'
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.content, b'detail\nNot found.\n')
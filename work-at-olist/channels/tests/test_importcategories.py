@@ -1,13 +1,34 @@
 """Test file for the importcategories command."""
 
+from io import StringIO
+from os import remove
 from os.path import join
+from unittest.mock import patch
 
-from channels.models import Category, Channel
+from channels.importer import BulkImporter
+from channels.models import Category, Channel, ImportCheckpoint
+from channels.tests import commit
 from django.core.management import call_command, CommandError
+from django.db import DatabaseError
 from django.test import TestCase
 from workatolist.settings import BASE_DIR
 
 
+def mptt_tree(channel_name):
+    """Return the mptt structure of a channel using relative tree ids."""
+    channel = Channel.objects.get(name=channel_name)
+    categories = Category.objects.filter(channel=channel).order_by(
+        'tree_id', 'lft'
+    ).values_list('reference', 'tree_id', 'lft', 'rght', 'level')
+    tree_ids = sorted({category[1] for category in categories})
+
+    return [
+        (reference[len(channel.reference):], tree_ids.index(tree_id),
+         lft, rght, level)
+        for reference, tree_id, lft, rght, level in categories
+    ]
+
+
 class TestImportCategoriesCommand(TestCase):
     """Tests for the "importcategories" command."""
 
@@ -39,6 +60,16 @@ class TestImportCategoriesCommand(TestCase):
             4
         )
 
+    def test_category_paths(self):
+        """Test if the categories are stored with their full path."""
+        self.assertEqual(
+            Category.objects.get(
+                channel__name=self.channel,
+                path='Books / National Literature / Science Fiction'
+            ).reference,
+            'amazon-books-national-literature-science-fiction'
+        )
+
     def test_invalid_arguments(self):
         """Check if the command fails using invalid arguments."""
         self.assertRaises(
@@ -50,9 +81,257 @@ class TestImportCategoriesCommand(TestCase):
 
     def test_reimport(self):
         """Test if importing the file again works correctly."""
-        call_command('importcategories', self.channel, self.csv_file)
+        commit()
+        with patch(
+            'channels.management.commands.importcategories.write_snapshot'
+        ) as write_snapshot:
+            call_command('importcategories', self.channel, self.csv_file)
+        self.assertFalse(write_snapshot.called)
         self.assertTrue(Channel.objects.get(name=self.channel))
         self.assertEqual(
             Category.objects.filter(channel__name=self.channel).count(),
             29
         )
+
+
+class TestBulkImportCategoriesCommand(TestImportCategoriesCommand):
+    """Run the "importcategories" tests using the --bulk option."""
+
+    def setUp(self):
+        """Call importcategories command in bulk mode before test cases."""
+        call_command(
+            'importcategories', self.channel, self.csv_file, '--bulk',
+            stdout=StringIO()
+        )
+
+    def test_same_tree_as_default_import(self):
+        """Check if bulk and default imports build the same mptt tree."""
+        call_command('importcategories', 'Legacy', self.csv_file)
+        self.assertEqual(mptt_tree(self.channel), mptt_tree('Legacy'))
+
+    def test_import_into_existing_tree(self):
+        """Check if new categories are merged into the existing trees."""
+        with open(self.csv_file) as csv_file:
+            lines = csv_file.readlines()
+
+        partial_csv = join(BASE_DIR, 'channels/tests/partial.csv')
+        with open(partial_csv, 'w') as csv_file:
+            csv_file.writelines(lines[:8] + lines[11:15])
+        self.addCleanup(remove, partial_csv)
+
+        call_command(
+            'importcategories', 'Partial', partial_csv, '--bulk',
+            stdout=StringIO()
+        )
+        call_command(
+            'importcategories', 'Partial', self.csv_file, '--bulk',
+            stdout=StringIO()
+        )
+        call_command('importcategories', 'Legacy', partial_csv)
+        call_command('importcategories', 'Legacy', self.csv_file)
+
+        self.assertEqual(mptt_tree('Partial'), mptt_tree('Legacy'))
+        self.assertEqual(
+            Category.objects.get(reference='partial-books')
+            .get_descendant_count(),
+            8
+        )
+
+    def test_gaps_in_one_tree(self):
+        """Check if many new subtrees of a stored tree are numbered right."""
+        with open(self.csv_file) as csv_file:
+            lines = csv_file.readlines()
+
+        partial_csv = join(BASE_DIR, 'channels/tests/partial.csv')
+        with open(partial_csv, 'w') as csv_file:
+            csv_file.writelines(lines[:4] + lines[6:8] + lines[10:])
+        self.addCleanup(remove, partial_csv)
+
+        for filename in (partial_csv, self.csv_file):
+            call_command('importcategories', 'Legacy', filename)
+        call_command(
+            'importcategories', 'Partial', partial_csv, '--bulk',
+            stdout=StringIO()
+        )
+        output = StringIO()
+        with patch.object(BulkImporter, 'gap_batch_size', 1):
+            call_command(
+                'importcategories', 'Partial', self.csv_file, '--bulk',
+                stdout=output
+            )
+
+        self.assertIn('Inserted 4 and renumbered 4', output.getvalue())
+        self.assertEqual(mptt_tree('Partial'), mptt_tree('Legacy'))
+
+    def test_generation(self):
+        """Check if only imports inserting categories bump the generation."""
+        generation = Channel.objects.get(name=self.channel).generation
+        self.assertGreater(generation, 0)
+
+        call_command(
+            'importcategories', self.channel, self.csv_file, '--bulk',
+            stdout=StringIO()
+        )
+        self.assertEqual(
+            Channel.objects.get(name=self.channel).generation, generation
+        )
+
+    def test_statistics_output(self):
+        """Check if the command reports inserted rows and phase timings."""
+        output = StringIO()
+        call_command(
+            'importcategories', 'Other', self.csv_file, '--bulk',
+            stdout=output
+        )
+        self.assertIn('Inserted 29 and renumbered 0', output.getvalue())
+        for phase in ('parse', 'diff', 'build', 'write'):
+            self.assertIn(phase, output.getvalue())
+
+
+class TestStreamImportCategoriesCommand(TestImportCategoriesCommand):
+    """Run the "importcategories" tests using the --stream option."""
+
+    def setUp(self):
+        """Call importcategories command in small batches before tests."""
+        call_command(
+            'importcategories', self.channel, self.csv_file,
+            '--stream', '--batch-size', '4', stdout=StringIO()
+        )
+
+    def test_same_tree_as_default_import(self):
+        """Check if streaming and default imports build the same tree."""
+        call_command('importcategories', 'Legacy', self.csv_file)
+        self.assertEqual(mptt_tree(self.channel), mptt_tree('Legacy'))
+        self.assertFalse(ImportCheckpoint.objects.exists())
+
+    def test_resume_interrupted_import(self):
+        """Check if committed batches are kept and the import resumes."""
+        write = BulkImporter.write
+        calls = []
+
+        def failing_write(importer):
+            calls.append(importer)
+            if len(calls) == 3:
+                raise DatabaseError('Bad line')
+            write(importer)
+
+        with patch.object(BulkImporter, 'write', failing_write):
+            with self.assertRaises(CommandError):
+                call_command(
+                    'importcategories', 'Other', self.csv_file,
+                    '--stream', '--batch-size', '10', stdout=StringIO()
+                )
+
+        checkpoint = ImportCheckpoint.objects.get(channel__name='Other')
+        self.assertEqual(checkpoint.row, 20)
+        self.assertEqual(
+            Category.objects.filter(channel__name='Other').count(), 20
+        )
+
+        call_command(
+            'importcategories', 'Other', self.csv_file,
+            '--stream', '--batch-size', '10', '--resume', stdout=StringIO()
+        )
+        self.assertEqual(
+            Category.objects.filter(channel__name='Other').count(), 29
+        )
+        self.assertFalse(ImportCheckpoint.objects.exists())
+
+
+class TestSyncImportCategoriesCommand(TestImportCategoriesCommand):
+    """Run the "importcategories" tests using the --sync option."""
+
+    def setUp(self):
+        """Synchronize the sample csv before test cases."""
+        self.sync(self.csv_file)
+        commit()
+
+    def sync(self, csv_file):
+        """Synchronize the channel with a csv file, returning the output."""
+        output = StringIO()
+        call_command(
+            'importcategories', self.channel, csv_file, '--sync',
+            stdout=output
+        )
+        return output.getvalue()
+
+    def feed(self, replace=(), drop=(), add=()):
+        """Write a copy of the sample csv with changed lines."""
+        with open(self.csv_file) as csv_file:
+            lines = [line.rstrip('\n') for line in csv_file]
+
+        for old, new in replace:
+            lines = [line.replace(old, new) for line in lines]
+        lines = [
+            line for line in lines
+            if not any(line.startswith(prefix) for prefix in drop)
+        ] + list(add)
+
+        feed_csv = join(BASE_DIR, 'channels/tests/feed.csv')
+        with open(feed_csv, 'w') as csv_file:
+            csv_file.write('\n'.join(lines) + '\n')
+        self.addCleanup(remove, feed_csv)
+        return feed_csv
+
+    def test_same_tree_as_default_import(self):
+        """Check if synchronizing and default imports build the same tree."""
+        call_command('importcategories', 'Legacy', self.csv_file)
+        self.assertEqual(mptt_tree(self.channel), mptt_tree('Legacy'))
+
+    def test_delta(self):
+        """Check if only the added, removed and renamed rows are applied."""
+        computers = Category.objects.get(path='Books / Computers')
+        feed_csv = self.feed(
+            replace=[('Books / Computers', 'Books / Informatics')],
+            drop=['Games / XBOX One'],
+            add=['Games / Switch', 'Games / Switch / Console']
+        )
+        output = self.sync(feed_csv)
+        self.assertIn('Added 2, removed 4 and renamed 1', output)
+
+        informatics = Category.objects.get(path='Books / Informatics')
+        self.assertEqual(informatics.pk, computers.pk)
+        self.assertEqual(informatics.reference, 'amazon-books-informatics')
+        self.assertEqual(
+            Category.objects.get(
+                path='Books / Informatics / Database'
+            ).reference,
+            'amazon-books-informatics-database'
+        )
+        self.assertFalse(
+            Category.objects.filter(path__startswith='Games / XBOX One')
+        )
+        self.assertEqual(
+            Category.objects.filter(channel__name=self.channel).count(), 27
+        )
+
+        call_command('importcategories', 'Legacy', feed_csv)
+        self.assertEqual(
+            sorted(Category.objects.filter(
+                channel__name=self.channel
+            ).values_list('path', flat=True)),
+            sorted(Category.objects.filter(
+                channel__name='Legacy'
+            ).values_list('path', flat=True))
+        )
+
+    def test_unchanged_feed(self):
+        """Check if an unchanged feed does not write anything."""
+        generation = Channel.objects.get(name=self.channel).generation
+        with self.assertNumQueries(6):
+            output = self.sync(self.csv_file)
+
+        self.assertIn('Added 0, removed 0 and renamed 0', output)
+        self.assertEqual(
+            Channel.objects.get(name=self.channel).generation, generation
+        )
+
+    def test_changes_outside_sync(self):
+        """Check if categories changed since the last sync are diffed."""
+        Category.objects.create(
+            channel=Channel.objects.get(name=self.channel), name='Extra'
+        )
+        output = self.sync(self.csv_file)
+
+        self.assertIn('Added 0, removed 1 and renamed 0', output)
+        self.assertFalse(Category.objects.filter(path='Extra').exists())
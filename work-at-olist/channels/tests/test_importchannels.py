@@ -0,0 +1,87 @@
+"""Test file for the importchannels command."""
+
+from io import StringIO
+from os.path import join
+from tempfile import TemporaryDirectory
+
+from channels.models import Category, Channel
+from django.core.management import call_command, CommandError
+from django.test import TestCase
+from workatolist.settings import BASE_DIR
+
+
+class TestImportChannelsCommand(TestCase):
+    """Tests for the "importchannels" command."""
+
+    csv_file = join(BASE_DIR, 'channels/tests/sample.csv')
+
+    def setUp(self):
+        """Create a directory for the manifest and the broken csv files."""
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+        with open(join(self.directory, 'broken.csv'), 'wb') as csv_file:
+            csv_file.write(b'Category\nBooks\n\xff\xfe / Broken\n')
+
+    def manifest(self, *lines):
+        """Write a manifest with the given channel/file pairs."""
+        filename = join(self.directory, 'manifest.csv')
+        with open(filename, 'w') as manifest:
+            manifest.write('Channel,File\n')
+            manifest.writelines(
+                '{},{}\n'.format(channel, csv_file)
+                for channel, csv_file in lines
+            )
+        return filename
+
+    def test_channels_imported(self):
+        """Check if every channel of the manifest is imported."""
+        output = StringIO()
+        call_command(
+            'importchannels',
+            self.manifest(('Amazon', self.csv_file), ('Ebay', self.csv_file)),
+            '--workers', '1', stdout=output
+        )
+
+        for channel in ('Amazon', 'Ebay'):
+            self.assertEqual(
+                Category.objects.filter(channel__name=channel).count(), 29
+            )
+            self.assertIn(
+                '{}: 29 lines, 29 inserted'.format(channel), output.getvalue()
+            )
+
+    def test_failures_are_isolated(self):
+        """Check if a broken csv does not roll back the other channels."""
+        output = StringIO()
+        with self.assertRaises(CommandError) as context:
+            call_command(
+                'importchannels',
+                self.manifest(
+                    ('Amazon', self.csv_file),
+                    ('Broken', 'broken.csv'),
+                    ('Missing', 'missing.csv')
+                ),
+                '--workers', '1', stdout=output
+            )
+
+        self.assertIn('Broken, Missing', str(context.exception))
+        self.assertIn('Broken: 0 lines, 0 inserted', output.getvalue())
+        self.assertEqual(
+            Category.objects.filter(channel__name='Amazon').count(), 29
+        )
+        self.assertFalse(
+            Category.objects.filter(channel__name='Broken').exists()
+        )
+
+    def test_invalid_manifest(self):
+        """Check if the command fails with duplicated channel names."""
+        self.assertRaises(
+            CommandError, call_command, 'importchannels',
+            self.manifest(('Amazon', self.csv_file), ('Amazon', 'other.csv'))
+        )
+        self.assertRaises(
+            CommandError, call_command, 'importchannels', 'missing.csv'
+        )
+        self.assertFalse(Channel.objects.exists())
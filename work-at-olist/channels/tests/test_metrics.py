@@ -0,0 +1,90 @@
+"""Test file for the request metrics."""
+
+import json
+import os
+from tempfile import TemporaryDirectory
+
+from channels.metrics import registry
+from channels.models import Category, Channel
+from django.db import connection
+from django.test import override_settings, TestCase
+
+
+class MetricsTest(TestCase):
+    """Tests for the MetricsMiddleware and the metrics endpoint."""
+
+    def setUp(self):
+        """Use an empty metrics directory and registry."""
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+        settings = override_settings(METRICS_DIRECTORY=self.directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        registry.reset()
+        self.addCleanup(registry.reset)
+
+        channel = Channel.objects.create(name='Amazon')
+        Category.objects.create(channel=channel, name='Books')
+
+    def test_request_metrics(self):
+        """Check if the metrics of each view action are recorded."""
+        self.client.get('/api/v1/category/')
+        self.client.get('/api/v1/category/')
+        self.client.get('/api/v1/category/amazon-books/')
+
+        content = self.client.get('/metrics').content.decode('utf-8')
+        labels = 'view="CategoryViewSet",action="list"'
+        self.assertIn(
+            'workatolist_request_seconds_count{%s} 2' % labels, content
+        )
+        self.assertIn(
+            'workatolist_queries_bucket{%s,le="+Inf"} 2' % labels, content
+        )
+        self.assertIn(
+            'workatolist_response_bytes_count{%s} 2' % labels, content
+        )
+        self.assertIn(
+            'workatolist_serializer_seconds_count'
+            '{view="CategoryViewSet",action="retrieve"} 1', content
+        )
+
+    def test_workers_aggregated(self):
+        """Check if the histograms written by other workers are added."""
+        self.client.get('/api/v1/channel/')
+        histograms = {
+            'ChannelViewSet\tlist\tqueries': [0, 0, 5] + [0] * 7 + [15, 5]
+        }
+        with open(os.path.join(self.directory, '1.json'), 'w') as worker:
+            json.dump(histograms, worker)
+
+        content = self.client.get('/metrics').content.decode('utf-8')
+        labels = 'view="ChannelViewSet",action="list"'
+        self.assertIn('workatolist_queries_count{%s} 6' % labels, content)
+        self.assertIn(
+            'workatolist_queries_bucket{%s,le="3"} 6' % labels, content
+        )
+
+    def test_queries_not_logged(self):
+        """Check if queries are counted without the debug cursor."""
+        self.client.get('/api/v1/channel/')
+        # The log is emptied when a request starts
+        self.assertEqual(len(connection.queries_log), 0)
+        self.assertFalse(connection.force_debug_cursor)
+        self.assertNotIn('make_cursor', connection.__dict__)
+
+        content = self.client.get('/metrics').content.decode('utf-8')
+        self.assertIn(
+            'workatolist_queries_bucket'
+            '{view="ChannelViewSet",action="list",le="1"} 0', content
+        )
+
+    @override_settings(SLOW_REQUEST_SECONDS=0)
+    def test_slow_request_logged(self):
+        """Check if slow requests are logged with their SQL."""
+        with self.assertLogs('channels.middleware', 'WARNING') as logs:
+            self.client.get('/api/v1/channel/')
+        self.assertIn('Slow request GET /api/v1/channel/', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
@@ -1,6 +1,7 @@
 """Test models Channel and Category."""
 
 from channels.models import Category, Channel
+from channels.tests import commit
 from django.test import TestCase
 
 
@@ -22,6 +23,19 @@ class ChannelTest(TestCase):
         """Test if Channel reference is correct."""
         self.assertTrue(Channel.objects.get(reference=self.channel_reference))
 
+    def test_channel_generation(self):
+        """Test if saving a stale channel keeps the newer generations."""
+        channel = Channel.objects.get(name=self.channel_name)
+        Channel.bump_generation(channel.pk)
+        commit()
+        Channel.bump_generation(channel.pk)
+        commit()
+
+        channel.name = 'Renamed'
+        channel.save()
+        self.assertEqual(channel.generation, 3)
+        self.assertEqual(Channel.objects.get(pk=channel.pk).generation, 3)
+
 
 class CategoryTest(TestCase):
     """Test cases for the Category model."""
@@ -78,3 +92,122 @@ class CategoryTest(TestCase):
             ).count(),
             2
         )
+
+    def test_category_path(self):
+        """Check if the path of the categories is built from the parents."""
+        self.assertEqual(self.parent_category.path, 'Books')
+        self.assertEqual(self.child_category.path, 'Books / Fantasy')
+
+    def test_category_path_rename(self):
+        """Check if renaming a category updates the path of descendants."""
+        grandchild = Category.objects.create(
+            channel=self.channel, name='Epic', parent=self.child_category
+        )
+        self.parent_category.name = 'Livros'
+        self.parent_category.save()
+
+        self.assertEqual(
+            Category.objects.get(pk=grandchild.pk).path,
+            'Livros / Fantasy / Epic'
+        )
+
+    def test_category_path_rename_stale(self):
+        """Check if a rename reaches children added since it was loaded."""
+        books = Category.objects.get(pk=self.parent_category.pk)
+        Category.objects.create(
+            channel=self.channel, name='Comics',
+            parent=Category.objects.get(pk=self.parent_category.pk)
+        )
+        books.name = 'Livros'
+        books.save()
+
+        self.assertEqual(
+            set(Category.objects.filter(parent=books).values_list(
+                'path', flat=True
+            )),
+            {'Livros / Fantasy', 'Livros / Comics'}
+        )
+
+    def test_category_path_rename_case(self):
+        """Check if a rename leaves the paths of other trees untouched."""
+        other = Category.objects.create(channel=self.channel, name='Other')
+        old = Category.objects.create(
+            channel=self.channel, name='Old', parent=other
+        )
+        # Paths matching the prefix of Books when compared ignoring case
+        Category.objects.filter(pk=other.pk).update(path='BOOKS')
+        Category.objects.filter(pk=old.pk).update(path='BOOKS / Old')
+        self.parent_category.name = 'Livros'
+        self.parent_category.save()
+
+        self.assertTrue(Category.objects.filter(path='BOOKS / Old').exists())
+        self.assertEqual(
+            Category.objects.get(pk=self.child_category.pk).path,
+            'Livros / Fantasy'
+        )
+
+    def test_category_path_length(self):
+        """Check if deep paths of long names are stored whole."""
+        category = None
+        for level in range(6):
+            category = Category.objects.create(
+                channel=self.channel, name='.' * 255 + str(level),
+                parent=category
+            )
+        self.assertEqual(
+            len(Category.objects.get(pk=category.pk).path), 6 * 256 + 5 * 3
+        )
+
+    def test_category_path_move(self):
+        """Check if moving a category updates the path of the subtree."""
+        grandchild = Category.objects.create(
+            channel=self.channel, name='Epic', parent=self.child_category
+        )
+        games = Category.objects.create(channel=self.channel, name='Games')
+
+        child = Category.objects.get(pk=self.child_category.pk)
+        child.move_to(games, 'last-child')
+        self.assertEqual(
+            Category.objects.get(pk=child.pk).path, 'Games / Fantasy'
+        )
+        self.assertEqual(
+            Category.objects.get(pk=grandchild.pk).path,
+            'Games / Fantasy / Epic'
+        )
+
+        child.parent = Category.objects.get(pk=self.parent_category.pk)
+        child.save()
+        self.assertEqual(
+            Category.objects.get(pk=grandchild.pk).path,
+            'Books / Fantasy / Epic'
+        )
+
+    def test_load_parent(self):
+        """Check if the parent and channel are loaded with one query."""
+        child = Category.objects.get(pk=self.child_category.pk)
+        with self.assertNumQueries(1):
+            child.load_parent()
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                child.build_slug(),
+                self.categories.get('child').get('reference')
+            )
+
+    def test_build_references(self):
+        """Check if references built in memory match the saved ones."""
+        parent = Category.objects.get(pk=self.parent_category.pk)
+        epic = Category(channel=self.channel, parent=parent, name='Épic Ñame')
+        long = Category(channel=self.channel, parent=epic, name='x' * 120)
+        orphan = Category(channel_id=self.channel.pk, name='Games')
+
+        with self.assertNumQueries(1):
+            Category.build_references([epic, long, orphan])
+
+        for category in (epic, long, orphan):
+            reference = category.reference
+            category.save()
+            self.assertEqual(
+                Category.objects.get(pk=category.pk).reference, reference
+            )
+        self.assertEqual(epic.reference, 'amazon-books-epic-name')
+        self.assertEqual(len(long.reference), 100)
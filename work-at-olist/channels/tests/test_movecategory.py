@@ -0,0 +1,131 @@
+"""Test file for the subtree moves and the movecategory command."""
+
+from io import StringIO
+from os.path import join
+
+from channels.models import Category
+from channels.reorganize import move_category, rename_category
+from channels.tests import commit
+from channels.utils import join_path
+from django.core.management import call_command, CommandError
+from django.test import TestCase
+from workatolist.settings import BASE_DIR
+
+
+class MoveCategoryTest(TestCase):
+    """Tests for move_category, rename_category and their command."""
+
+    channel = 'Amazon'
+    csv_file = join(BASE_DIR, 'channels/tests/sample.csv')
+
+    def setUp(self):
+        """Import the sample csv before test cases."""
+        call_command('importcategories', self.channel, self.csv_file)
+        commit()
+
+    def assertTreeConsistent(self):
+        """Check the paths, references and mptt columns of every category."""
+        categories = {
+            category.pk: category
+            for category in Category.objects.select_related('channel')
+        }
+        for category in categories.values():
+            category.parent = categories.get(category.parent_id)
+        for category in categories.values():
+            self.assertEqual(category.path, join_path(
+                category.parent.path if category.parent else '',
+                category.name
+            ))
+            self.assertEqual(category.reference, category.build_slug())
+
+            children = {
+                child.pk for child in categories.values()
+                if child.parent_id == category.pk
+            }
+            self.assertEqual(children, {
+                child.pk for child in category.get_children()
+            })
+
+    def test_move(self):
+        """Check if a moved subtree gets new paths and references."""
+        games = Category.objects.get(reference='amazon-games')
+        entertainment = Category.objects.create(
+            channel=games.channel, name='Entertainment'
+        )
+
+        with self.assertNumQueries(13):
+            reorganized = move_category(games, entertainment)
+        self.assertEqual(tuple(reorganized), (10, 10, 10))
+
+        self.assertEqual(games.path, 'Entertainment / Games')
+        console = Category.objects.get(path=join_path(
+            'Entertainment', 'Games', 'XBOX One', 'Console'
+        ))
+        self.assertEqual(
+            console.reference, 'amazon-entertainment-games-xbox-one-console'
+        )
+        self.assertEqual(console.get_root(), entertainment)
+        self.assertTreeConsistent()
+
+        move_category(games, None)
+        self.assertTrue(
+            Category.objects.filter(reference='amazon-games-xbox-one').exists()
+        )
+        self.assertTreeConsistent()
+
+    def test_rename(self):
+        """Check if renaming updates the whole subtree, moving no rows."""
+        books = Category.objects.get(reference='amazon-books')
+        reorganized = rename_category(books, 'Livros')
+        self.assertEqual(tuple(reorganized), (9, 9, 9))
+        self.assertTrue(Category.objects.filter(
+            reference='amazon-livros-national-literature-science-fiction',
+            path='Livros / National Literature / Science Fiction'
+        ).exists())
+        self.assertTreeConsistent()
+
+    def test_truncated_references(self):
+        """Check if references at the maximum length are rebuilt."""
+        books = Category.objects.get(reference='amazon-books')
+        long = Category.objects.create(
+            channel=books.channel, name='F' * 84, parent=books
+        )
+        Category.objects.create(
+            channel=books.channel, name='Epic', parent=long
+        )
+        rename_category(books, 'Livros')
+        self.assertTreeConsistent()
+
+    def test_invalid_moves(self):
+        """Check if moves into the subtree or onto a sibling are refused."""
+        games = Category.objects.get(reference='amazon-games')
+        xbox = Category.objects.get(reference='amazon-games-xbox-one')
+        with self.assertRaises(ValueError):
+            move_category(games, xbox)
+        with self.assertRaises(ValueError):
+            rename_category(games, 'Books')
+        self.assertTreeConsistent()
+
+    def test_command(self):
+        """Check if the command moves the category and reports the rows."""
+        output = StringIO()
+        call_command(
+            'movecategory', 'amazon-computers', '--parent', 'amazon-books',
+            '--name', 'Hardware', stdout=output
+        )
+        self.assertEqual(
+            output.getvalue(),
+            'Books / Hardware: 4 categories, 4 references and 4 paths '
+            'updated.\n'
+        )
+        self.assertTrue(Category.objects.filter(
+            reference='amazon-books-hardware-tablets'
+        ).exists())
+
+        with self.assertRaises(CommandError):
+            call_command('movecategory', 'amazon-books', stdout=output)
+        with self.assertRaises(CommandError):
+            call_command(
+                'movecategory', 'amazon-books', '--name', 'Games',
+                stdout=output
+            )
@@ -0,0 +1,123 @@
+"""Test file for the compressed snapshots of the category trees."""
+
+import gzip
+from io import StringIO
+import json
+import os
+from tempfile import TemporaryDirectory
+
+from channels.models import Category, Channel
+from channels.snapshots import get_snapshot
+from channels.tests import commit
+from django.core.management import call_command, CommandError
+from django.test import override_settings, TestCase
+
+
+class SnapshotTest(TestCase):
+    """Tests for the tree endpoint and the snapshots command."""
+
+    url = '/api/v1/channel/amazon/tree/'
+
+    def setUp(self):
+        """Use an empty snapshot directory and create a small tree."""
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+        settings = override_settings(SNAPSHOT_DIRECTORY=self.directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.channel = Channel.objects.create(name='Amazon')
+        books = Category.objects.create(channel=self.channel, name='Books')
+        Category.objects.create(
+            channel=self.channel, name='Fantasy', parent=books
+        )
+        commit()
+
+    def test_gzip(self):
+        """Test if the gzip file is sent as it is with its headers."""
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+        content = json.loads(gzip.decompress(
+            b''.join(response.streaming_content)
+        ).decode('utf-8'))
+        self.assertEqual(content, {
+            'name': 'Amazon',
+            'reference': 'amazon',
+            'categories': [{
+                'name': 'Books',
+                'reference': 'amazon-books',
+                'children': [{
+                    'name': 'Fantasy',
+                    'reference': 'amazon-books-fantasy',
+                    'children': []
+                }]
+            }]
+        })
+
+    def test_identity(self):
+        """Test if clients without gzip get the decompressed tree."""
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        content = json.loads(
+            b''.join(response.streaming_content).decode('utf-8')
+        )
+        self.assertEqual(content.get('reference'), 'amazon')
+
+    def test_etag(self):
+        """Test if the ETag is kept until the tree changes."""
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        Category.objects.create(channel=self.channel, name='Games')
+        response = self.client.get(
+            self.url, HTTP_IF_NONE_MATCH=etag, HTTP_ACCEPT_ENCODING='gzip'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn(b'Games', gzip.decompress(
+            b''.join(response.streaming_content)
+        ))
+
+    def test_stale_files(self):
+        """Test if snapshots of older generations are removed."""
+        first = get_snapshot(self.channel)
+        self.assertTrue(os.path.exists(first.path('gzip')))
+
+        Category.objects.create(channel=self.channel, name='Games')
+        second = get_snapshot(Channel.objects.get(pk=self.channel.pk))
+        self.assertNotEqual(first.digest, second.digest)
+        self.assertFalse(os.path.exists(first.path('gzip')))
+        self.assertTrue(os.path.exists(second.path('gzip')))
+
+    def test_deleted_channel(self):
+        """Test if a channel recreated with the same name gets its tree."""
+        self.client.get(self.url)
+        self.channel.delete()
+        commit()
+        self.assertEqual(os.listdir(self.directory), [])
+
+        channel = Channel.objects.create(name='Amazon')
+        Category.objects.create(channel=channel, name='Games')
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='')
+        content = b''.join(response.streaming_content)
+        self.assertIn(b'Games', content)
+        self.assertNotIn(b'Books', content)
+
+    def test_command(self):
+        """Test if the command writes the snapshot of each channel."""
+        Channel.objects.create(name='Ebay')
+        output = StringIO()
+        call_command('snapshots', stdout=output)
+        self.assertEqual(sorted(os.listdir(self.directory)), sorted(
+            channel.pk.hex for channel in Channel.objects.all()
+        ))
+        self.assertIn('amazon: ', output.getvalue())
+
+        with self.assertRaises(CommandError):
+            call_command('snapshots', 'unknown', stdout=output)
@@ -0,0 +1,149 @@
+"""Test file for the tree indexes of the channels."""
+
+from io import StringIO
+import os
+from tempfile import TemporaryDirectory
+
+from channels.models import Category, Channel
+from channels.treeindex import tree_indexes, TreeIndex, write_tree_index
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings, TestCase
+
+
+class TreeIndexTest(TestCase):
+    """Tests for the tree index files and the views reading them."""
+
+    def setUp(self):
+        """Create a tree and write its index to an empty directory."""
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+        settings = override_settings(
+            TREE_INDEX=True, TREE_INDEX_DIRECTORY=self.directory
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.channel = Channel.objects.create(name='Amazon')
+        books = Category.objects.create(channel=self.channel, name='Books')
+        fantasy = Category.objects.create(
+            channel=self.channel, name='Fantasy', parent=books
+        )
+        Category.objects.create(
+            channel=self.channel, name='Épico', parent=fantasy
+        )
+        Category.objects.create(
+            channel=self.channel, name='Comics', parent=books
+        )
+        Category.objects.create(channel=self.channel, name='Games')
+        self.filename = write_tree_index(self.channel)
+
+    def get(self, url, tree_index):
+        """Return the response of the url, with or without the index."""
+        cache.clear()
+        with self.settings(TREE_INDEX=tree_index):
+            return self.client.get('/api/v1/category/' + url)
+
+    def test_index(self):
+        """Test the lookups of the nodes of the index."""
+        index = TreeIndex.open(self.filename)
+        self.assertEqual(len(index), 5)
+        self.assertEqual(index.channel, 'amazon')
+
+        node = index.find('amazon-books-fantasy-epico')
+        self.assertEqual(index.name(node), 'Épico')
+        self.assertEqual(index.path(node), 'Books / Fantasy / Épico')
+        self.assertEqual(
+            [index.name(ancestor) for ancestor in index.ancestors(node)],
+            ['Books', 'Fantasy']
+        )
+        self.assertEqual(
+            [index.name(root) for root in index.children()],
+            ['Books', 'Games']
+        )
+        self.assertEqual(index.find_path(('Books', 'Comics')),
+                         index.find('amazon-books-comics'))
+        self.assertIsNone(index.find('amazon-unknown'))
+        self.assertIsNone(index.find_path(('Games', 'Comics')))
+
+    def test_detail(self):
+        """Test if details are the same as the database ones, no queries."""
+        for reference in ('amazon-books', 'amazon-books-fantasy-epico'):
+            expected = self.get(reference + '/', tree_index=False)
+            with self.assertNumQueries(0):
+                response = self.get(reference + '/', tree_index=True)
+            self.assertEqual(response.content, expected.content)
+            self.assertEqual(response['ETag'], expected['ETag'])
+
+    def test_path(self):
+        """Test if path lookups are the same as the database ones."""
+        for path in ('Books / Fantasy', 'Books/Unknown'):
+            url = '?channel=amazon&path=' + path
+            expected = self.get(url, tree_index=False)
+            with self.assertNumQueries(0):
+                response = self.get(url, tree_index=True)
+            self.assertEqual(response.content, expected.content)
+
+    def test_reload(self):
+        """Test if a change writes the index again once committed."""
+        Category.objects.create(channel=self.channel, name='Music')
+        Category.objects.create(channel=self.channel, name='Movies')
+
+        callbacks = [callback for savepoints, callback
+                     in connection.run_on_commit
+                     if getattr(callback, 'channel_id', None)]
+        self.assertEqual(len(callbacks), 1)
+        callbacks[0]()
+
+        self.assertEqual(
+            self.get('amazon-music/', tree_index=True).status_code, 200
+        )
+        index, node = tree_indexes.find('amazon-music')
+        self.assertEqual(len(index), 7)
+
+    def run_callbacks(self):
+        """Run the index callbacks waiting for the transaction to commit."""
+        for savepoints, callback in connection.run_on_commit:
+            if getattr(callback, 'channel_id', None):
+                callback()
+
+    def test_renamed_channel(self):
+        """Test if a renamed channel keeps a single file."""
+        self.channel.name = 'Amazon BR'
+        self.channel.save()
+        write_tree_index(self.channel)
+        self.assertEqual(
+            os.listdir(self.directory), [self.channel.pk.hex + '.idx']
+        )
+        self.assertEqual(tree_indexes.get('amazon-br').channel_id,
+                         self.channel.pk)
+
+    def test_deleted_channel(self):
+        """Test if the file of a deleted channel is removed."""
+        with open(self.filename, 'rb') as index_file:
+            content = index_file.read()
+        self.channel.delete()
+        self.run_callbacks()
+        self.assertEqual(os.listdir(self.directory), [])
+        self.assertEqual(
+            self.get('amazon-books-fantasy/', tree_index=True).status_code,
+            404
+        )
+
+        # A new channel with the same name replaces a file left behind
+        with open(self.filename, 'wb') as index_file:
+            index_file.write(content)
+        channel = Channel.objects.create(name='Amazon')
+        write_tree_index(channel)
+        self.assertEqual(os.listdir(self.directory), [channel.pk.hex + '.idx'])
+
+    def test_command(self):
+        """Test if the command writes the index of each channel."""
+        Channel.objects.create(name='Ebay')
+        call_command('treeindex', stdout=StringIO())
+        self.assertEqual(sorted(os.listdir(self.directory)), sorted(
+            channel.pk.hex + '.idx' for channel in Channel.objects.all()
+        ))
@@ -1,6 +1,14 @@
 """Test file for the utils functions and classes."""
 
-from channels.utils import Attrgetter
+import operator
+import pickle
+from types import SimpleNamespace
+import uuid
+
+from channels.models import Category, Channel
+from channels.utils import (
+    Attrgetter, cached_attrgetter, nest_ancestors, nest_descendants, uuid7
+)
 from django.test import TestCase
 
 
@@ -20,3 +28,85 @@ class TestUtils(TestCase):
         )
         with self.assertRaises(TypeError):
             Attrgetter({})(obj)
+
+    def test_attrgetter_missing(self):
+        """Test if missing attributes are returned as empty strings."""
+        child = SimpleNamespace(
+            name='Fantasy', parent=SimpleNamespace(reference='books')
+        )
+        root = SimpleNamespace(name='Books', parent=None)
+        getter = Attrgetter('parent.reference', 'name')
+
+        self.assertEqual(getter(child), ('books', 'Fantasy'))
+        self.assertEqual(getter(root), ('', 'Books'))
+        self.assertEqual(Attrgetter('parent.reference')(root), '')
+        self.assertEqual(
+            Attrgetter('missing.name', 'name')(root), ('', 'Books')
+        )
+
+    def test_attrgetter_model(self):
+        """Test if required attributes of a model skip the Python getters."""
+        getter = Attrgetter('parent.reference', 'name', model=Category)
+        root = Category(name='Books', parent=None)
+        child = Category(name='Fantasy', parent=Category(reference='books'))
+        self.assertEqual(getter(child), ('books', 'Fantasy'))
+        self.assertEqual(getter(root), ('', 'Books'))
+
+        getter = Attrgetter('channel.reference', model=Category)
+        self.assertIs(getter._call.__class__, operator.attrgetter)
+        self.assertEqual(pickle.loads(pickle.dumps(getter))(
+            Category(channel=Channel(reference='amazon'))
+        ), 'amazon')
+
+    def test_cached_attrgetter(self):
+        """Test if getters are created once for each attribute spec."""
+        getter = cached_attrgetter('parent.reference', 'name')
+        self.assertIs(cached_attrgetter('parent.reference', 'name'), getter)
+        self.assertIsNot(cached_attrgetter('name'), getter)
+        self.assertEqual(
+            getter(SimpleNamespace(name='Books', parent=None)), ('', 'Books')
+        )
+        with self.assertRaises(TypeError):
+            cached_attrgetter({})
+
+    def test_nest_ancestors(self):
+        """Test if the ancestors are nested from the closest one."""
+        self.assertIsNone(nest_ancestors([]))
+        self.assertEqual(
+            nest_ancestors([('Books', 'books'), ('Fantasy', 'fantasy')]),
+            {
+                'name': 'Fantasy',
+                'reference': 'fantasy',
+                'parent': {
+                    'name': 'Books', 'reference': 'books', 'parent': None
+                }
+            }
+        )
+
+    def test_nest_descendants(self):
+        """Test if the descendants are nested keeping their order."""
+        self.assertEqual(nest_descendants(1, []), [])
+        self.assertEqual(
+            nest_descendants(1, [
+                (3, 2, 'Epic', 'epic'),
+                (2, 1, 'Fantasy', 'fantasy'),
+                (4, 1, 'Poetry', 'poetry')
+            ]),
+            [
+                {'name': 'Fantasy', 'reference': 'fantasy', 'children': [
+                    {'name': 'Epic', 'reference': 'epic', 'children': []}
+                ]},
+                {'name': 'Poetry', 'reference': 'poetry', 'children': []}
+            ]
+        )
+
+    def test_uuid7(self):
+        """Test if the time-ordered ids are version 7 and increasing."""
+        ids = [uuid7() for _ in range(5000)]
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(len(set(ids)), len(ids))
+        self.assertEqual({(uid.version, uid.variant) for uid in ids},
+                         {(7, uuid.RFC_4122)})
+        self.assertEqual(sorted(uid.hex for uid in ids), [
+            uid.hex for uid in ids
+        ])
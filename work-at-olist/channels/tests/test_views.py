@@ -1,9 +1,17 @@
 """Test API endpoints for Category and Channel."""
 
+from collections import OrderedDict
 import json
 
 from channels.models import Category, Channel
-from django.test import Client, TestCase
+from channels.search import indexes
+from channels.serializers import CategoryListSerializer
+from channels.tests import commit
+from django.core.cache import cache
+from django.test import (
+    Client, override_settings, TestCase, TransactionTestCase
+)
+from rest_framework.renderers import JSONRenderer
 
 
 class BaseViewTest(TestCase):
@@ -19,6 +27,7 @@ class BaseViewTest(TestCase):
 
     def setUp(self):
         """Create channel and categories for the test cases."""
+        cache.clear()
         self.channel = Channel.objects.create(
             name=self.channel_info.get('name')
         )
@@ -32,6 +41,7 @@ class BaseViewTest(TestCase):
             name=self.categories.get('child').get('name'),
             parent=self.parent_category
         )
+        commit()
 
 
 class ChannelViewTest(BaseViewTest):
@@ -68,7 +78,64 @@ class ChannelViewTest(BaseViewTest):
         self.assertEqual(
             content.get('reference'), self.channel_info.get('reference')
         )
-        self.assertEqual(len(content.get('categories')), 2)
+        self.assertEqual(content.get('categories').get('count'), 2)
+        self.assertEqual(len(content.get('categories').get('results')), 2)
+
+    def test_channel_detail_pagination(self):
+        """Test if the categories of the channel detail are paginated."""
+        response = self.client.get(
+            '{base}/{endpoint}/{identifier}/?limit=1'.format(
+                base=self.api_base_url,
+                endpoint=self.endpoint,
+                identifier=self.channel_info.get('reference')
+            )
+        )
+        self.assertEqual(response.status_code, 200)
+
+        categories = json.loads(response.content).get('categories')
+        self.assertEqual(categories.get('count'), 2)
+        self.assertEqual(len(categories.get('results')), 1)
+
+        response = self.client.get(categories.get('next'))
+        categories = json.loads(response.content).get('categories')
+        self.assertEqual(
+            categories.get('results')[0].get('reference'),
+            self.categories.get('child').get('reference')
+        )
+        self.assertIsNone(categories.get('next'))
+        self.assertIsNotNone(categories.get('previous'))
+
+    def test_channel_detail_stream(self):
+        """Test if the categories can be streamed as newline delimited json."""
+        response = self.client.get(
+            '{base}/{endpoint}/{identifier}/?format=ndjson'.format(
+                base=self.api_base_url,
+                endpoint=self.endpoint,
+                identifier=self.channel_info.get('reference')
+            )
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+
+        lines = b''.join(response.streaming_content).splitlines()
+        self.assertEqual(
+            [json.loads(line.decode()) for line in lines],
+            [
+                {
+                    'reference': 'amazon-books',
+                    'name': 'Books',
+                    'channel': 'amazon',
+                    'parent_reference': None
+                },
+                {
+                    'reference': 'amazon-books-fantasy',
+                    'name': 'Fantasy',
+                    'channel': 'amazon',
+                    'parent_reference': 'amazon-books'
+                }
+            ]
+        )
 
 
 class CategoryViewTest(BaseViewTest):
@@ -89,6 +156,82 @@ class CategoryViewTest(BaseViewTest):
         content = json.loads(response.content)
         self.assertEqual(content.get('count'), 2)
 
+    def test_category_list_lean(self):
+        """Test if the lean rows render as the serialized categories."""
+        Category.objects.create(channel=self.channel, name='Jogos e Ação')
+        response = self.client.get(
+            '{base}/{endpoint}/'.format(
+                base=self.api_base_url,
+                endpoint=self.endpoint
+            )
+        )
+
+        serializer = CategoryListSerializer(
+            Category.objects.order_by('tree_id', 'lft'), many=True
+        )
+        self.assertEqual(response.content, JSONRenderer().render(
+            OrderedDict([
+                ('count', 3),
+                ('next', None),
+                ('previous', None),
+                ('results', serializer.data)
+            ])
+        ))
+
+    def test_category_list_cursor(self):
+        """Test if the cursors walk the categories in tree order."""
+        url = '{base}/{endpoint}/?limit=1'.format(
+            base=self.api_base_url,
+            endpoint=self.endpoint
+        )
+        Category.objects.create(channel=self.channel, name='Games')
+        pages = []
+
+        while url:
+            content = json.loads(self.client.get(url).content)
+            pages.append(content)
+            url = content.get('next')
+
+        self.assertEqual(
+            [page.get('results')[0].get('name') for page in pages],
+            ['Books', 'Fantasy', 'Games']
+        )
+        self.assertIsNone(pages[0].get('previous'))
+
+        content = json.loads(self.client.get(pages[-1]['previous']).content)
+        self.assertEqual(content.get('results'), pages[1].get('results'))
+        self.assertEqual(content.get('next'), pages[1].get('next'))
+
+        for cursor in ('invalid', 'W2ZhbHNlLCBbIngiLCB7fV1d',
+                       'W2ZhbHNlLCBbMSwgbnVsbF1d'):
+            response = self.client.get(
+                '{base}/{endpoint}/?cursor={cursor}'.format(
+                    base=self.api_base_url,
+                    endpoint=self.endpoint,
+                    cursor=cursor
+                )
+            )
+            self.assertEqual(response.status_code, 404)
+
+    def test_category_path_lookup(self):
+        """Test if categories are found by their path."""
+        other_channel = Channel.objects.create(name='Ebay')
+        Category.objects.create(channel=other_channel, name='Books')
+
+        for query, count in (('path=Books/Fantasy', 1),
+                             ('path=Books / Fantasy&channel=amazon', 1),
+                             ('path=Books', 2),
+                             ('path=Books&channel=ebay', 1),
+                             ('path=Fantasy', 0)):
+            content = json.loads(self.client.get(
+                '{base}/{endpoint}/?{query}'.format(
+                    base=self.api_base_url,
+                    endpoint=self.endpoint,
+                    query=query
+                )
+            ).content)
+            self.assertEqual(len(content.get('results')), count, query)
+
     def test_parent_category_detail(self):
         """Test if the endpoint correctly shows the parent category details."""
         response = self.client.get(
@@ -135,3 +278,379 @@ class CategoryViewTest(BaseViewTest):
             self.categories.get('parent').get('reference')
         )
         self.assertEqual(len(content.get('children')), 0)
+
+
+class QueryCountViewTest(BaseViewTest):
+    """Check the number of queries of each endpoint does not grow."""
+
+    def setUp(self):
+        """Create more categories, so N+1 queries would be noticed."""
+        super(QueryCountViewTest, self).setUp()
+        for name in ('Fiction', 'Romance', 'Poetry'):
+            Category.objects.create(
+                channel=self.channel, name=name, parent=self.child_category
+            )
+
+    def assertQueries(self, url, num):
+        """Assert the number of queries used to get the url."""
+        with self.assertNumQueries(num):
+            response = self.client.get(self.api_base_url + url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_channel_queries(self):
+        """Test the queries of the channel list and detail endpoints."""
+        self.assertQueries('/channel/', 3)
+        self.assertQueries('/channel/amazon/', 3)
+        self.assertQueries('/channel/amazon/categories/?level=1', 3)
+
+    def test_category_queries(self):
+        """Test the queries of the category list endpoint."""
+        self.assertQueries('/category/', 3)
+
+    def test_cached_queries(self):
+        """Test if cached responses only query the version of the data."""
+        for url in ('/channel/', '/channel/amazon/', '/category/',
+                    '/category/amazon-books/'):
+            self.client.get(self.api_base_url + url)
+            self.assertQueries(url, 1)
+
+    def test_category_detail_queries(self):
+        """Test if the parent and children trees take one query each."""
+        self.assertQueries('/category/amazon-books/', 2)
+        self.assertQueries('/category/amazon-books-fantasy/', 3)
+        self.assertQueries('/category/amazon-books-fantasy-poetry/', 2)
+
+    def test_category_detail_trees(self):
+        """Test if the nested parents and children are built correctly."""
+        content = json.loads(
+            self.client.get(self.api_base_url + '/category/amazon-books/')
+            .content
+        )
+        fantasy = content.get('children')[0]
+        self.assertEqual(fantasy.get('reference'), 'amazon-books-fantasy')
+        self.assertEqual(
+            [child.get('name') for child in fantasy.get('children')],
+            ['Fiction', 'Romance', 'Poetry']
+        )
+
+        content = json.loads(self.client.get(
+            self.api_base_url + '/category/amazon-books-fantasy-poetry/'
+        ).content)
+        self.assertEqual(content.get('children'), [])
+        self.assertEqual(content.get('parent'), {
+            'name': 'Fantasy',
+            'reference': 'amazon-books-fantasy',
+            'parent': {
+                'name': 'Books', 'reference': 'amazon-books', 'parent': None
+            }
+        })
+
+
+class CacheViewTest(BaseViewTest):
+    """Test the cache and conditional requests of the read endpoints."""
+
+    urls = ('/channel/', '/channel/amazon/', '/category/',
+            '/category/amazon-books/')
+
+    def test_etag(self):
+        """Test if a matching If-None-Match gets a 304 response."""
+        for url in self.urls:
+            response = self.client.get(self.api_base_url + url)
+            self.assertTrue(response.has_header('ETag'))
+            self.assertTrue(response.has_header('Last-Modified'))
+
+            response = self.client.get(
+                self.api_base_url + url,
+                HTTP_IF_NONE_MATCH=response['ETag']
+            )
+            self.assertEqual(response.status_code, 304)
+
+    def test_last_modified(self):
+        """Test if a matching If-Modified-Since gets a 304 response."""
+        for url in self.urls:
+            response = self.client.get(self.api_base_url + url)
+            response = self.client.get(
+                self.api_base_url + url,
+                HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+            )
+            self.assertEqual(response.status_code, 304)
+
+    def test_invalidation(self):
+        """Test if changing the categories generates new responses."""
+        etags = [
+            self.client.get(self.api_base_url + url)['ETag']
+            for url in self.urls
+        ]
+        Category.objects.create(
+            channel=self.channel, name='Epic', parent=self.parent_category
+        )
+
+        for url, etag in zip(self.urls, etags):
+            response = self.client.get(
+                self.api_base_url + url, HTTP_IF_NONE_MATCH=etag
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+
+        content = json.loads(
+            self.client.get(self.api_base_url + '/channel/amazon/').content
+        )
+        self.assertEqual(content.get('categories').get('count'), 3)
+
+    def test_channel_list_invalidation(self):
+        """Test if renaming or deleting a channel changes the list ETag."""
+        url = self.api_base_url + '/channel/'
+        etag = self.client.get(url)['ETag']
+
+        Channel.objects.create(name='Olist')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        etag = response['ETag']
+        Channel.objects.filter(name='Olist').delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content).get('count'), 1)
+
+    def test_absolute_links(self):
+        """Test if cached pagination links follow the host of the request."""
+        url = self.api_base_url + '/category/?limit=1'
+        self.client.get(url, HTTP_HOST='internal.local')
+        response = self.client.get(
+            url, HTTP_HOST='api.example.com', secure=True
+        )
+        self.assertTrue(json.loads(response.content).get('next').startswith(
+            'https://api.example.com/'
+        ))
+        self.assertIn('Accept', response['Vary'])
+
+    def test_recreated_catalogue(self):
+        """Test if a catalogue replaced by an equal sized one is not cached."""
+        url = self.api_base_url + '/category/'
+        response = self.client.get(url)
+        generation = Channel.objects.get(pk=self.channel.pk).generation
+
+        self.channel.delete()
+        channel = Channel.objects.create(name='Ebay')
+        Category.objects.create(channel=channel, name='New')
+        Channel.objects.filter(pk=channel.pk).update(generation=generation)
+        commit()
+
+        content = json.loads(self.client.get(
+            url, HTTP_IF_NONE_MATCH=response['ETag']
+        ).content)
+        self.assertEqual(
+            [result.get('name') for result in content.get('results')],
+            ['New']
+        )
+
+    def test_generation(self):
+        """Test if the generation of the channel follows its changes."""
+        generation = Channel.objects.get(pk=self.channel.pk).generation
+        self.child_category.delete()
+        self.assertEqual(
+            Channel.objects.get(pk=self.channel.pk).generation,
+            generation + 1
+        )
+
+
+class SearchViewTest(BaseViewTest):
+    """Test the search of categories by name."""
+
+    def setUp(self):
+        """Create categories with names sharing prefixes and words."""
+        super(SearchViewTest, self).setUp()
+        for name in ('Science Fiction', 'Fiction Fantastic', 'Fables'):
+            Category.objects.create(
+                channel=self.channel, name=name, parent=self.child_category
+            )
+        other = Channel.objects.create(name='Ebay')
+        Category.objects.create(channel=other, name='Fiction')
+        commit()
+
+    def search(self, query, status=200):
+        """Return the names and paths found by the search query."""
+        response = self.client.get(
+            self.api_base_url + '/channel/amazon/search/?' + query
+        )
+        self.assertEqual(response.status_code, status)
+        return json.loads(response.content)
+
+    def test_prefix(self):
+        """Test if names starting with the prefix are found in order."""
+        results = self.search('prefix=fa').get('results')
+        self.assertEqual(
+            [result.get('name') for result in results],
+            ['Fables', 'Fantasy']
+        )
+        self.assertEqual(
+            results[0].get('path'), 'Books / Fantasy / Fables'
+        )
+        self.assertEqual(
+            results[0].get('reference'), 'amazon-books-fantasy-fables'
+        )
+
+    def test_search(self):
+        """Test if name prefixes rank before the other words."""
+        results = self.search('search=FIC').get('results')
+        self.assertEqual(
+            [result.get('name') for result in results],
+            ['Fiction Fantastic', 'Science Fiction']
+        )
+        self.assertEqual(len(self.search('search=f&limit=2')['results']), 2)
+
+    def test_missing_term(self):
+        """Test if a search without terms is rejected."""
+        self.search('limit=2', status=400)
+
+    @override_settings(SEARCH_STALE_INDEX=False)
+    def test_index_follows_generation(self):
+        """Test if new categories are found after the generation changes."""
+        self.assertEqual(self.search('prefix=epic').get('results'), [])
+        Category.objects.create(
+            channel=self.channel, name='Epic', parent=self.child_category
+        )
+        self.assertEqual(
+            self.search('prefix=epic').get('results')[0].get('path'),
+            'Books / Fantasy / Epic'
+        )
+
+
+class StaleSearchIndexTest(TransactionTestCase):
+    """Test the search index served while a new one is built.
+
+    The index is built by another thread, with its own database
+    connection, so the data of the tests has to be committed.
+    """
+
+    def test_stale_index(self):
+        """Test if the previous index is served until the new one is built."""
+        channel = Channel.objects.create(name='Amazon')
+        Category.objects.create(channel=channel, name='Books')
+        self.assertEqual(len(indexes.get(channel).find('b')), 1)
+
+        Category.objects.create(channel=channel, name='Bikes')
+        channel.refresh_from_db()
+        self.assertEqual(len(indexes.get(channel).find('b')), 1)
+        indexes.wait()
+        self.assertEqual(
+            [result['name'] for result in indexes.get(channel).find('b')],
+            ['Bikes', 'Books']
+        )
+
+
+class ChannelCategoriesViewTest(BaseViewTest):
+    """Test the categories nested in the channel endpoint."""
+
+    url = '/channel/amazon/categories/'
+
+    def setUp(self):
+        """Create another tree and a deeper level."""
+        super(ChannelCategoriesViewTest, self).setUp()
+        Category.objects.create(
+            channel=self.channel, name='Epic', parent=self.child_category
+        )
+        Category.objects.create(channel=self.channel, name='Games')
+        Category.objects.create(
+            channel=Channel.objects.create(name='Ebay'), name='Books'
+        )
+
+    def names(self, query='', status=200):
+        """Return the names of the categories listed with the query."""
+        response = self.client.get(self.api_base_url + self.url + query)
+        self.assertEqual(response.status_code, status)
+        if status != 200:
+            return None
+        return [
+            category.get('name')
+            for category in json.loads(response.content).get('results')
+        ]
+
+    def test_categories(self):
+        """Test if only the categories of the channel are listed."""
+        self.assertEqual(self.names(), ['Books', 'Fantasy', 'Epic', 'Games'])
+
+    def test_filters(self):
+        """Test the level, parent and roots filters."""
+        self.assertEqual(self.names('?level=1'), ['Fantasy'])
+        self.assertEqual(self.names('?roots=true'), ['Books', 'Games'])
+        self.assertEqual(
+            self.names('?parent=amazon-books-fantasy'), ['Epic']
+        )
+        self.assertEqual(self.names('?parent=unknown'), [])
+        self.names('?level=first', status=400)
+
+    def test_cursor(self):
+        """Test if the filters are kept while walking the pages."""
+        response = self.client.get(
+            self.api_base_url + self.url + '?level=0&limit=1'
+        )
+        content = json.loads(response.content)
+        self.assertEqual(content.get('count'), 2)
+
+        content = json.loads(self.client.get(content.get('next')).content)
+        self.assertEqual(
+            [category.get('name') for category in content.get('results')],
+            ['Games']
+        )
+        self.assertIsNone(content.get('next'))
+
+
+class BatchViewTest(BaseViewTest):
+    """Test the lookup of many categories by reference."""
+
+    url = '/api/v1/category/batch/'
+
+    def test_query_params(self):
+        """Test if the categories are returned in the requested order."""
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                self.url + '?reference=amazon-books-fantasy'
+                '&reference=amazon-unknown&reference=amazon-books'
+                '&reference=amazon-books-fantasy'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content).get('results'), [
+            {
+                'reference': 'amazon-books-fantasy',
+                'name': 'Fantasy',
+                'channel': 'amazon',
+                'parent_reference': 'amazon-books'
+            },
+            {'reference': 'amazon-unknown', 'detail': 'Not found.'},
+            {
+                'reference': 'amazon-books',
+                'name': 'Books',
+                'channel': 'amazon',
+                'parent_reference': None
+            }
+        ])
+
+    def test_post(self):
+        """Test if references are read from JSON and form bodies."""
+        response = self.client.post(
+            self.url,
+            json.dumps({'references': ['amazon-books', 'amazon-unknown']}),
+            content_type='application/json'
+        )
+        results = json.loads(response.content).get('results')
+        self.assertEqual(
+            [result.get('name') for result in results], ['Books', None]
+        )
+
+        response = self.client.post(
+            self.url, {'reference': ['amazon-books-fantasy']}
+        )
+        results = json.loads(response.content).get('results')
+        self.assertEqual(results[0].get('name'), 'Fantasy')
+
+    def test_invalid(self):
+        """Test if empty, malformed and too large batches are rejected."""
+        self.assertEqual(self.client.get(self.url).status_code, 400)
+        self.assertEqual(self.client.post(
+            self.url, json.dumps({'references': 'amazon-books'}),
+            content_type='application/json'
+        ).status_code, 400)
+        self.assertEqual(self.client.get(self.url + '?' + '&'.join(
+            'reference={}'.format(index) for index in range(501)
+        )).status_code, 400)
@@ -0,0 +1,400 @@
+"""Read-only category trees of the channels, shared through mapped files.
+
+With TREE_INDEX enabled, the tree of each channel is written to a file in
+TREE_INDEX_DIRECTORY as parallel arrays of integers, one entry per node in
+tree order, and a block of strings. Every worker maps the files read only,
+so their pages are shared by all processes through the page cache, and
+category details, with their ancestors and descendants, and path lookups
+are answered without querying the database.
+
+Files are named after the id of their channel. A change to a channel
+writes its file again once the transaction commits, to a temporary file
+renamed over the old one, and deleting a channel removes its file. Workers
+check the directory on each lookup and map the files that changed, while
+lookups already holding the previous map keep reading it.
+
+Layout of a file, integers in native byte order:
+    header: magic, version, channel id, generation, time modified, number
+            of nodes n and length of the channel reference
+    channel reference, padded to 4 bytes
+    parent, tree_id, lft, rght, level, by_reference: n int32 each
+    name and reference offsets: n + 1 int32 each, into the strings
+    strings: the utf-8 names followed by the references
+
+Usage:
+    write_tree_index(channel)
+    index, node = tree_indexes.find('amazon-books')
+    index.detail(node)
+"""
+
+from array import array
+from collections import OrderedDict
+from datetime import datetime, timezone
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+import uuid
+
+from channels.models import Category
+from channels.utils import join_path, nest_ancestors, nest_descendants
+from django.conf import settings
+from django.db import connection, transaction
+
+
+HEADER = struct.Struct('=4sI16sqdII')
+MAGIC = b'CTIX'
+VERSION = 1
+
+# Arrays of n integers, in the order they are stored
+ARRAYS = ('parent', 'tree_id', 'lft', 'rght', 'level', 'by_reference')
+
+
+class TreeIndex:
+    """The category tree of a channel, read from a mapped buffer.
+
+    Nodes are numbered in tree order, so the descendants of a node are the
+    nodes right after it, as many as its subtree has, and each node has
+    the index of its parent, -1 for roots.
+    """
+
+    def __init__(self, buffer):
+        """Read the arrays and strings of a buffer written by pack."""
+        view = memoryview(buffer)
+        (magic, version, channel_id, self.generation, timestamp,
+         count, length) = HEADER.unpack_from(view)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('Not a tree index file.')
+
+        self.channel_id = uuid.UUID(bytes=channel_id)
+        # Same as channels.cache.channel_version of the channel
+        self.version = '{pk}-{generation}'.format(
+            pk=self.channel_id.hex, generation=self.generation
+        )
+        self.time_modified = datetime.fromtimestamp(timestamp, timezone.utc)
+        position = HEADER.size
+        self.channel = str(view[position:position + length], 'utf-8')
+        position += length + -length % 4
+
+        self.count = count
+        for name in ARRAYS:
+            setattr(self, name, view[position:position + 4 * count].cast('i'))
+            position += 4 * count
+        for name in ('name_offsets', 'reference_offsets'):
+            setattr(self, name, view[position:position + 4 * count + 4].cast(
+                'i'
+            ))
+            position += 4 * count + 4
+        self.strings = view[position:]
+
+    @classmethod
+    def open(cls, filename):
+        """Map the file read only and read its index."""
+        with open(filename, 'rb') as index_file:
+            return cls(mmap.mmap(
+                index_file.fileno(), 0, access=mmap.ACCESS_READ
+            ))
+
+    def __len__(self):
+        """Return the number of categories of the channel."""
+        return self.count
+
+    def name(self, node):
+        """Return the name of a node."""
+        return str(
+            self.strings[self.name_offsets[node]:self.name_offsets[node + 1]],
+            'utf-8'
+        )
+
+    def reference(self, node):
+        """Return the reference of a node, as bytes."""
+        return bytes(self.strings[
+            self.reference_offsets[node]:self.reference_offsets[node + 1]
+        ])
+
+    def end(self, node):
+        """Return the node after the last descendant of a node."""
+        return node + (self.rght[node] - self.lft[node] + 1) // 2
+
+    def children(self, node=None):
+        """Yield the children of a node, the roots when node is None."""
+        child, end = (0, self.count) if node is None \
+            else (node + 1, self.end(node))
+        while child < end:
+            yield child
+            child = self.end(child)
+
+    def ancestors(self, node):
+        """Return the ancestors of a node, from its root."""
+        ancestors = []
+        while self.parent[node] != -1:
+            node = self.parent[node]
+            ancestors.append(node)
+        return ancestors[::-1]
+
+    def descendants(self, node):
+        """Return the descendants of a node, in tree order."""
+        return range(node + 1, self.end(node))
+
+    def find(self, reference):
+        """Return the node with the reference, None when there is none."""
+        reference = reference.encode('utf-8')
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.reference(self.by_reference[middle]) < reference:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count and \
+                self.reference(self.by_reference[low]) == reference:
+            return self.by_reference[low]
+        return None
+
+    def find_path(self, names):
+        """Return the node with the path of names, None when there is none."""
+        node = None
+        for name in names:
+            node = next((
+                child for child in self.children(node)
+                if self.name(child) == name
+            ), None)
+            if node is None:
+                return None
+        return node
+
+    def path(self, node):
+        """Return the path of a node, e.g. "Books / Fantasy"."""
+        return join_path(*map(self.name, self.ancestors(node) + [node]))
+
+    def row(self, node):
+        """Return a node as serialized by the CategoryListSerializer."""
+        parent = self.parent[node]
+        return OrderedDict([
+            ('reference', self.reference(node).decode('utf-8')),
+            ('name', self.name(node)),
+            ('channel', self.channel),
+            ('parent_reference', self.reference(parent).decode('utf-8')
+             if parent != -1 else None)
+        ])
+
+    def detail(self, node):
+        """Return a node as serialized by the CategoryDetailSerializer.
+
+        Children are in tree order, the order of the arrays.
+        """
+        ancestors = self.ancestors(node)
+        descendants = self.descendants(node)
+        return OrderedDict([
+            ('reference', self.reference(node).decode('utf-8')),
+            ('name', self.name(node)),
+            ('channel', self.channel),
+            ('parent', nest_ancestors(
+                (self.name(ancestor),
+                 self.reference(ancestor).decode('utf-8'))
+                for ancestor in ancestors
+            ) if ancestors else None),
+            ('children', nest_descendants(node, (
+                (descendant, self.parent[descendant], self.name(descendant),
+                 self.reference(descendant).decode('utf-8'))
+                for descendant in descendants
+            )))
+        ])
+
+
+def pack(channel, rows):
+    """Return the index file of the channel and its rows as bytes.
+
+    The rows are (pk, parent pk, tree_id, lft, rght, level, name,
+    reference) tuples in tree order.
+    """
+    nodes = {row[0]: node for node, row in enumerate(rows)}
+    arrays = OrderedDict((name, array('i')) for name in ARRAYS)
+    names = [row[6].encode('utf-8') for row in rows]
+    references = [row[7].encode('utf-8') for row in rows]
+
+    for pk, parent, tree_id, lft, rght, level, name, reference in rows:
+        arrays['parent'].append(nodes[parent] if parent is not None else -1)
+        arrays['tree_id'].append(tree_id)
+        arrays['lft'].append(lft)
+        arrays['rght'].append(rght)
+        arrays['level'].append(level)
+    arrays['by_reference'].extend(
+        sorted(range(len(rows)), key=references.__getitem__)
+    )
+
+    offsets = array('i', [0])
+    for string in names + references:
+        offsets.append(offsets[-1] + len(string))
+
+    reference = channel.reference.encode('utf-8')
+    return b''.join([
+        HEADER.pack(
+            MAGIC, VERSION, channel.pk.bytes, channel.generation,
+            channel.time_modified.timestamp(), len(rows), len(reference)
+        ),
+        reference, b'\0' * (-len(reference) % 4)
+    ] + [values.tobytes() for values in arrays.values()] + [
+        offsets[:len(names) + 1].tobytes(),
+        offsets[len(names):].tobytes()
+    ] + names + references)
+
+
+def index_filename(channel_id):
+    """Return the name of the index file of a channel."""
+    return os.path.join(
+        settings.TREE_INDEX_DIRECTORY, channel_id.hex + '.idx'
+    )
+
+
+def read_channel(filename):
+    """Return the id and the reference of the channel of an index file."""
+    with open(filename, 'rb') as index_file:
+        header = HEADER.unpack(index_file.read(HEADER.size))
+        reference = index_file.read(header[-1])
+    return uuid.UUID(bytes=header[2]), str(reference, 'utf-8')
+
+
+def write_tree_index(channel):
+    """Write the index file of the channel, replacing the previous one.
+
+    Other files of the channel, or of a deleted channel with the same
+    reference, are removed.
+    """
+    channel.refresh_from_db(
+        fields=['reference', 'generation', 'time_modified']
+    )
+    rows = list(Category.objects.filter(channel=channel).order_by(
+        'tree_id', 'lft'
+    ).values_list(
+        'pk', 'parent_id', 'tree_id', 'lft', 'rght', 'level', 'name',
+        'reference'
+    ))
+
+    directory = settings.TREE_INDEX_DIRECTORY
+    os.makedirs(directory, exist_ok=True)
+    descriptor, temporary = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(descriptor, 'wb') as index_file:
+        index_file.write(pack(channel, rows))
+    filename = index_filename(channel.pk)
+    os.replace(temporary, filename)
+
+    for other in os.listdir(directory):
+        other = os.path.join(directory, other)
+        if other.endswith('.idx') and other != filename:
+            try:
+                channel_id, reference = read_channel(other)
+                if channel_id == channel.pk or reference == channel.reference:
+                    os.remove(other)
+            except (OSError, struct.error, UnicodeDecodeError):
+                continue
+    return filename
+
+
+def remove_tree_index(channel_id):
+    """Remove the index file of a channel, if there is one."""
+    try:
+        os.remove(index_filename(channel_id))
+    except FileNotFoundError:
+        pass
+
+
+def schedule_tree_index(sender, channel_id, **kwargs):
+    """Write the index of a changed channel when the transaction commits.
+
+    Connected to the channel_changed signal when the app is ready. Each
+    channel is written once per transaction, however many categories
+    changed, and the file of a channel deleted since is removed.
+    """
+    if not settings.TREE_INDEX:
+        return
+
+    def rebuild():
+        """Write the index of the channel, remove it if it was deleted."""
+        channel = sender.objects.filter(pk=channel_id).first()
+        if channel is None:
+            remove_tree_index(channel_id)
+        else:
+            write_tree_index(channel)
+    rebuild.channel_id = channel_id
+
+    if any(getattr(callback, 'channel_id', None) == channel_id
+           for savepoints, callback in connection.run_on_commit):
+        return
+    transaction.on_commit(rebuild)
+
+
+def schedule_tree_index_removal(sender, instance, **kwargs):
+    """Remove the index of a deleted channel when the transaction commits.
+
+    Connected to the post_delete signal of Channel when the app is ready.
+    """
+    schedule_tree_index(sender, instance.pk)
+
+
+class TreeIndexes:
+    """The indexes of every channel, mapped from TREE_INDEX_DIRECTORY."""
+
+    def __init__(self):
+        """Start with no indexes."""
+        self.lock = threading.Lock()
+        self.directory = None
+        self.modified = None
+        self.files = {}
+
+    def refresh(self):
+        """Return the indexes, mapping again the files that changed.
+
+        The directory is listed again whenever its modification time
+        changes, and for a second after, since the clock of the file
+        system may not tick between two changes.
+        """
+        directory = settings.TREE_INDEX_DIRECTORY
+        try:
+            modified = os.stat(directory).st_mtime_ns
+        except FileNotFoundError:
+            modified = None
+
+        with self.lock:
+            settled = modified is None or time.time() - modified / 1e9 > 1
+            if settled and \
+                    (directory, modified) == (self.directory, self.modified):
+                return [index for key, index in self.files.values()]
+
+            files = {}
+            for filename in os.listdir(directory) if modified else ():
+                if not filename.endswith('.idx'):
+                    continue
+                path = os.path.join(directory, filename)
+                try:
+                    stat = os.stat(path)
+                    key = (stat.st_ino, stat.st_mtime_ns)
+                    cached = self.files.get(filename)
+                    files[filename] = cached if cached and cached[0] == key \
+                        else (key, TreeIndex.open(path))
+                except (OSError, ValueError):
+                    continue
+
+            self.directory, self.modified, self.files = \
+                directory, modified, files
+            return [index for key, index in files.values()]
+
+    def get(self, channel_reference):
+        """Return the index of a channel, None when it has none."""
+        for index in self.refresh():
+            if index.channel == channel_reference:
+                return index
+        return None
+
+    def find(self, reference):
+        """Return the index and node of a category reference, or None."""
+        for index in self.refresh():
+            node = index.find(reference)
+            if node is not None:
+                return index, node
+        return None
+
+
+tree_indexes = TreeIndexes()
@@ -1,5 +1,89 @@
 """This file contains the common used functions in the project."""
 
+from functools import lru_cache, partial
+import operator
+import os
+import threading
+import time
+import uuid
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Case, Value, When
+
+# Separator of the category names in a path, e.g. "Books / Fantasy"
+PATH_SEPARATOR = ' / '
+
+# Milliseconds and counter of the last uuid7 of this process
+_uuid7_state = {'lock': threading.Lock(), 'milliseconds': 0, 'counter': 0}
+
+
+def split_path(value):
+    """Split a category path (e.g. "Books / Fantasy") into its names."""
+    return tuple(filter(None, map(str.strip, value.split('/'))))
+
+
+def join_path(*names):
+    """Join category names into a path, e.g. "Books / Fantasy"."""
+    return PATH_SEPARATOR.join(filter(None, names))
+
+
+def uuid7():
+    """Return a time-ordered UUID, version 7 of RFC 9562.
+
+    The first 48 bits are the Unix time in milliseconds, followed by a 12
+    bits counter and 62 random bits, so the ids created by a process always
+    increase and new rows are appended to the end of the primary key and
+    foreign key indexes, instead of being spread over random pages.
+    """
+    state = _uuid7_state
+    with state['lock']:
+        milliseconds = int(time.time() * 1000)
+        if milliseconds > state['milliseconds']:
+            # Random start, leaving half of the counter for the same ms
+            state['milliseconds'] = milliseconds
+            state['counter'] = int.from_bytes(os.urandom(2), 'big') & 0x7ff
+        elif state['counter'] < 0xfff:
+            # Same millisecond, or the clock went back
+            state['counter'] += 1
+        else:
+            state['milliseconds'] += 1
+            state['counter'] = 0
+        milliseconds, counter = state['milliseconds'], state['counter']
+
+    random = int.from_bytes(os.urandom(8), 'big') & (1 << 62) - 1
+    return uuid.UUID(int=(
+        milliseconds << 80 | 0x7 << 76 | counter << 64 | 0x2 << 62 | random
+    ))
+
+
+def _python_getter(attr):
+    """Return a getter of the dotted attr, missing parts as empty strings."""
+    names = attr.split('.')
+
+    def func(obj):
+        for name in names:
+            obj = getattr(obj, name, '')
+        return obj
+    return func
+
+
+def _required_attr(model, attr):
+    """Return whether every instance of the model has the dotted attr.
+
+    The relations on the way must be non-nullable foreign keys, so that
+    operator.attrgetter never meets a None or a missing attribute.
+    """
+    names = attr.split('.')
+    for name in names[:-1]:
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return False
+        if not field.concrete or not field.is_relation or field.null:
+            return False
+        model = field.related_model
+    return hasattr(model, names[-1])
+
 
 class Attrgetter:
     """Custom implementation of operator.attrgetter.
@@ -7,37 +91,47 @@ class Attrgetter:
     Returns a list of attributes from an object. If the attribute is not found,
     returns an empty string.
 
-    Usage: Attrgetter('person.name', 'person.id')(Person)
+    Given the model of the objects, the attributes it always has are read
+    by operator.attrgetter, which runs in C, and only the ones behind a
+    nullable relation by the Python getters. The choice is made once, when
+    the getter is created.
+
+    Usage: Attrgetter('person.name', 'person.id', model=Person)(person)
 
     The usage is the same as the builtin function:
     https://docs.python.org/3/library/operator.html#operator.attrgetter
     """
 
-    __slots__ = ('_attrs', '_call')
+    __slots__ = ('_attrs', '_model', '_call')
 
-    def __init__(self, attr, *attrs):
+    def __init__(self, attr, *attrs, model=None):
         """Create a callable func to retrieve the field(s) from the object."""
-        if not attrs:
-            if not isinstance(attr, str):
-                raise TypeError('attribute name must be a string')
-            self._attrs = (attr,)
-            names = attr.split('.')
+        self._attrs = (attr,) + attrs
+        self._model = model
+        if not all(isinstance(name, str) for name in self._attrs):
+            raise TypeError('attribute name must be a string')
 
-            def func(obj):
-                for name in names:
-                    obj = getattr(obj, name, '')
-                return obj
-            self._call = func
-        else:
-            self._attrs = (attr,) + attrs
-            getters = tuple(map(Attrgetter, self._attrs))
+        required = [
+            model is not None and _required_attr(model, name)
+            for name in self._attrs
+        ]
+        if all(required):
+            self._call = operator.attrgetter(*self._attrs)
+            return
 
+        getters = tuple(
+            operator.attrgetter(name) if fast else _python_getter(name)
+            for name, fast in zip(self._attrs, required)
+        )
+        if not attrs:
+            self._call = getters[0]
+        else:
             def func(obj):
                 return tuple(getter(obj) for getter in getters)
             self._call = func
 
     def __call__(self, obj):
-        """Return the callable created in the __init__ method."""
+        """Return the attributes, missing ones as empty strings."""
         return self._call(obj)
 
     def __repr__(self):
@@ -51,4 +145,69 @@ class Attrgetter:
 
         Url: https://docs.python.org/3/library/pickle.html#object.__reduce__
         """
-        return self.__class__, self._attrs
+        return partial(self.__class__, model=self._model), self._attrs
+
+
+@lru_cache(maxsize=None)
+def cached_attrgetter(attr, *attrs, model=None):
+    """Return the Attrgetter of the attributes, created once per spec.
+
+    Usage: cached_attrgetter('parent.reference', 'name', model=Category)
+    """
+    return Attrgetter(attr, *attrs, model=model)
+
+
+def bulk_update(queryset, rows, fields, batch_size=100):
+    """Update many rows of a queryset using one CASE statement per batch.
+
+    Django 1.11 has no ``bulk_update``, so each batch is written as a single
+    UPDATE where every field is a ``CASE pk WHEN ... THEN ... END`` expression.
+
+    Usage: bulk_update(Category.objects, {pk: (lft, rght)}, ('lft', 'rght'))
+
+    Returns the number of rows updated.
+    """
+    model = queryset.model
+    pks = list(rows)
+    updated = 0
+
+    for start in range(0, len(pks), batch_size):
+        batch = pks[start:start + batch_size]
+        values = {}
+        for index, name in enumerate(fields):
+            values[name] = Case(
+                *[When(pk=pk, then=Value(rows[pk][index])) for pk in batch],
+                output_field=model._meta.get_field(name)
+            )
+        updated += queryset.filter(pk__in=batch).update(**values)
+
+    return updated
+
+
+def nest_ancestors(ancestors):
+    """Nest a list of ancestors as parents of each other.
+
+    Receives (name, reference) pairs ordered from the root to the closest
+    ancestor and returns the closest one, e.g.:
+    {'name': 'Fantasy', 'reference': ..., 'parent': {'name': 'Books', ...}}
+    """
+    parent = None
+    for name, reference in ancestors:
+        parent = {'name': name, 'reference': reference, 'parent': parent}
+    return parent
+
+
+def nest_descendants(root, descendants):
+    """Nest a flat list of descendants as the children tree of root.
+
+    Receives (pk, parent pk, name, reference) tuples, the children of each
+    node keep the order in which they are received.
+    """
+    children = {root: []}
+    for pk, parent, name, reference in descendants:
+        children.setdefault(parent, []).append({
+            'name': name,
+            'reference': reference,
+            'children': children.setdefault(pk, [])
+        })
+    return children[root]
@@ -1,10 +1,34 @@
 """Views for the Channel and Category API."""
 
+from calendar import timegm
+from collections import OrderedDict
+import os
+
+from channels.cache import (
+    catalogue_version, channel_version, get_or_build, queryset_version
+)
+from channels.exporter import export_lines
+from channels.metrics import registry, timer
 from channels.models import Category, Channel
+from channels.pagination import CategoryPagination, ChannelPagination
+from channels.renderers import CSVRenderer, NDJSONRenderer
+from channels.search import search_categories
 from channels.serializers import (
     CategoryDetailSerializer, CategoryListSerializer,
     ChannelDetailSerializer, ChannelListSerializer
 )
+from channels.snapshots import get_snapshot, write_snapshot
+from channels.treeindex import tree_indexes
+from channels.utils import join_path, split_path
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework.decorators import detail_route, list_route
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import _positive_int
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.viewsets import ReadOnlyModelViewSet
 
 
@@ -19,6 +43,106 @@ class MultiSerializerViewSet(ReadOnlyModelViewSet):
             self.action, self.serializers.get('default')
         )
 
+    def get_queryset(self):
+        """Load the related objects used by the serializer of the action.
+
+        Serializers may define a setup_eager_loading(queryset) method which
+        adds the select_related/prefetch_related calls they need.
+        """
+        queryset = super(MultiSerializerViewSet, self).get_queryset()
+        setup_eager_loading = getattr(
+            self.get_serializer_class(), 'setup_eager_loading', None
+        )
+        if setup_eager_loading:
+            queryset = setup_eager_loading(queryset)
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        """List the objects, answering conditional requests first."""
+        version, last_modified = self.get_list_version(
+            self.filter_queryset(self.get_queryset())
+        )
+        if self.paginator is not None:
+            self.paginator.count_version = version
+
+        return self.cached_response(
+            version, last_modified,
+            lambda: self.get_list_data(request, *args, **kwargs)
+        )
+
+    def get_list_data(self, request, *args, **kwargs):
+        """Return the serialized data of a page of the list.
+
+        Serializers with lean_data build the rows straight from the values
+        of the queryset, instead of serializing model instances.
+        """
+        serializer_class = self.get_serializer_class()
+        if not hasattr(serializer_class, 'lean_data'):
+            return super(MultiSerializerViewSet, self).list(
+                request, *args, **kwargs
+            ).data
+
+        queryset = serializer_class.lean_values(
+            self.filter_queryset(self.get_queryset()),
+            *getattr(self.paginator, 'ordering', ())
+        )
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return serializer_class.lean_data(queryset)
+        return self.get_paginated_response(
+            serializer_class.lean_data(page)
+        ).data
+
+    def retrieve(self, request, *args, **kwargs):
+        """Show an object, answering conditional requests first."""
+        instance = self.get_object()
+        version, last_modified = self.get_object_version(instance)
+
+        return self.cached_response(
+            version, last_modified, lambda: self.get_detail_data(instance)
+        )
+
+    @staticmethod
+    def get_list_version(queryset):
+        """Return the version and last modification of a list."""
+        return queryset_version(queryset)
+
+    @staticmethod
+    def get_object_version(instance):
+        """Return the version and last modification of an object."""
+        return '{pk}-{timestamp}'.format(
+            pk=instance.pk, timestamp=instance.time_modified.timestamp()
+        ), instance.time_modified
+
+    def get_detail_data(self, instance):
+        """Return the serialized data of an object."""
+        return self.get_serializer(instance).data
+
+    def cached_response(self, version, last_modified, build):
+        """Return the data built by build, cached under the version.
+
+        The version and last modification are sent as the ETag and
+        Last-Modified headers, requests with a matching If-None-Match or
+        If-Modified-Since get a 304 response without building any data.
+        """
+        etag = 'W/"{}"'.format(version)
+        timestamp = timegm(last_modified.utctimetuple()) \
+            if last_modified else None
+
+        response = get_conditional_response(
+            self.request, etag=etag, last_modified=timestamp
+        )
+        if response is None:
+            with timer(self.request, 'serializer_seconds'):
+                data = get_or_build(version, self.request, build)
+            response = Response(data)
+
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+        patch_vary_headers(response, ('Accept',))
+        return response
+
 
 class ChannelViewSet(MultiSerializerViewSet):
     """List all channels and details if one is specified."""
@@ -26,18 +150,342 @@ class ChannelViewSet(MultiSerializerViewSet):
     # noinspection PyUnresolvedReferences
     queryset = Channel.objects.all()
     lookup_field = 'reference'
+    pagination_class = ChannelPagination
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + [NDJSONRenderer]
     serializers = {
         'list': ChannelListSerializer,
         'retrieve': ChannelDetailSerializer
     }
 
+    def retrieve(self, request, *args, **kwargs):
+        """Show the channel along with a page of its categories.
+
+        Using the ndjson format, e.g. /api/v1/channel/amazon/?format=ndjson,
+        all categories are streamed instead, one per line.
+        """
+        if request.accepted_renderer.format == NDJSONRenderer.format:
+            channel = self.get_object()
+            return self.stream_categories(channel, channel.categories.all())
+        return super(ChannelViewSet, self).retrieve(request, *args, **kwargs)
+
+    @staticmethod
+    def get_object_version(instance):
+        """Return the version of the channel and its categories."""
+        return channel_version(instance), instance.time_modified
+
+    def get_detail_data(self, instance):
+        """Return the channel along with a page of its categories."""
+        data = self.get_serializer(instance).data
+        data['categories'] = self.paginate_categories(
+            instance, instance.categories.all()
+        )
+        return data
+
+    @detail_route()
+    def categories(self, request, *args, **kwargs):
+        """List a page of the categories of the channel, in tree order.
+
+        The categories can be filtered by level, by the reference of their
+        parent or to the roots only, e.g.
+        /api/v1/channel/amazon/categories/?level=1
+        /api/v1/channel/amazon/categories/?parent=amazon-books
+        /api/v1/channel/amazon/categories/?roots=true
+        """
+        channel = self.get_object()
+        categories = channel.categories.all()
+        level = request.query_params.get('level')
+        parent = request.query_params.get('parent')
+
+        if level is not None:
+            try:
+                categories = categories.filter(level=int(level))
+            except ValueError:
+                raise ValidationError({'level': 'A number is required.'})
+        if parent is not None:
+            categories = categories.filter(parent__reference=parent)
+        if request.query_params.get('roots') in ('true', '1'):
+            categories = categories.filter(level=0)
+
+        return self.cached_response(
+            channel_version(channel), channel.time_modified,
+            lambda: self.paginate_categories(channel, categories)
+        )
+
+    def paginate_categories(self, channel, categories):
+        """Return the paginated data of the categories of the channel."""
+        paginator = CategoryPagination()
+        paginator.count_version = channel_version(channel)
+        page = paginator.paginate_queryset(
+            CategoryListSerializer.lean_values(
+                categories, *paginator.ordering
+            ),
+            self.request,
+            view=self
+        )
+        return paginator.get_paginated_response(
+            CategoryListSerializer.lean_data(page)
+        ).data
+
+    @detail_route(renderer_classes=api_settings.DEFAULT_RENDERER_CLASSES + [
+        CSVRenderer
+    ])
+    def export(self, request, *args, **kwargs):
+        """Stream the categories of the channel as the importcategories CSV.
+
+        e.g. /api/v1/channel/amazon/export/
+        """
+        channel = self.get_object()
+        response = StreamingHttpResponse(
+            export_lines(channel), content_type='text/csv; charset=utf-8'
+        )
+        response['Content-Disposition'] = \
+            'attachment; filename="{}.csv"'.format(channel.reference)
+        return response
+
+    @detail_route()
+    def tree(self, request, *args, **kwargs):
+        """Send the snapshot of the whole category tree of the channel.
+
+        The compressed file is sent as it is, with its Content-Encoding, to
+        the clients accepting it, e.g. /api/v1/channel/amazon/tree/
+        """
+        channel = self.get_object()
+        snapshot = get_snapshot(channel)
+        etag = 'W/"{}"'.format(snapshot.digest)
+        accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            try:
+                snapshot_file, encoding = snapshot.open(accept_encoding)
+            except FileNotFoundError:
+                # Removed by a concurrent write of a newer generation
+                snapshot_file, encoding = write_snapshot(channel).open(
+                    accept_encoding
+                )
+
+            response = FileResponse(
+                snapshot_file, content_type='application/json'
+            )
+            if encoding is not None:
+                response['Content-Encoding'] = encoding
+                response['Content-Length'] = os.fstat(
+                    snapshot_file.fileno()
+                ).st_size
+
+        response['ETag'] = etag
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+    @detail_route()
+    def search(self, request, *args, **kwargs):
+        """Find the categories of the channel by name.
+
+        e.g. /api/v1/channel/amazon/search/?prefix=sci finds the names
+        starting with "sci", /api/v1/channel/amazon/search/?search=fic the
+        names with a word starting with "fic". At most limit (10 by default,
+        up to 100) categories are returned, with their full path.
+        """
+        channel = self.get_object()
+        prefix = request.query_params.get('prefix')
+        term = prefix if prefix is not None \
+            else request.query_params.get('search')
+        if not term:
+            raise ValidationError(
+                {'search': 'Use the prefix or search parameter.'}
+            )
+
+        try:
+            limit = _positive_int(
+                request.query_params['limit'], strict=True, cutoff=100
+            )
+        except (KeyError, ValueError):
+            limit = 10
+
+        return self.cached_response(
+            channel_version(channel), channel.time_modified,
+            lambda: {'results': search_categories(
+                channel, term, prefix is not None, limit
+            )}
+        )
+
+    @staticmethod
+    def stream_categories(channel, categories):
+        """Stream the categories as they are read from the database cursor."""
+        rows = categories.values_list(
+            'reference', 'name', 'parent__reference'
+        ).iterator()
+
+        return StreamingHttpResponse(
+            (
+                NDJSONRenderer.encode({
+                    'reference': reference,
+                    'name': name,
+                    'channel': channel.reference,
+                    'parent_reference': parent_reference
+                })
+                for reference, name, parent_reference in rows
+            ),
+            content_type=NDJSONRenderer.media_type
+        )
+
 
 class CategoryViewSet(MultiSerializerViewSet):
     """List all categories or details of one if reference is specified."""
 
     queryset = Category.objects.all()
     lookup_field = 'reference'
+    pagination_class = CategoryPagination
     serializers = {
         'list': CategoryListSerializer,
         'retrieve': CategoryDetailSerializer
     }
+    max_batch_size = 500
+
+    def list(self, request, *args, **kwargs):
+        """List the categories, or find a path in the tree index.
+
+        With TREE_INDEX enabled, path lookups within a channel, e.g.
+        /api/v1/category/?channel=amazon&path=Books/Fantasy, are answered
+        from the index of the channel, when it has one.
+        """
+        params = request.query_params
+        index = None
+        if settings.TREE_INDEX and 'cursor' not in params and \
+                {'channel', 'path'} <= set(params):
+            index = tree_indexes.get(params['channel'])
+        if index is None:
+            return super(CategoryViewSet, self).list(request, *args, **kwargs)
+
+        node = index.find_path(split_path(params['path']))
+        return self.cached_response(
+            index.version, index.time_modified, lambda: OrderedDict([
+                ('count', int(node is not None)),
+                ('next', None),
+                ('previous', None),
+                ('results', [index.row(node)] if node is not None else [])
+            ])
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        """Show a category, from the tree index when enabled."""
+        found = None
+        if settings.TREE_INDEX:
+            found = tree_indexes.find(kwargs[self.lookup_field])
+        if found is None:
+            return super(CategoryViewSet, self).retrieve(
+                request, *args, **kwargs
+            )
+
+        index, node = found
+        return self.cached_response(
+            index.version, index.time_modified,
+            lambda: index.detail(node)
+        )
+
+    @list_route(methods=['get', 'post'])
+    def batch(self, request, *args, **kwargs):
+        """Find many categories by reference at once.
+
+        The references are sent as repeated query parameters, e.g.
+        /api/v1/category/batch/?reference=amazon-books&reference=amazon-games
+        or POSTed as {"references": [...]}, up to max_batch_size. The
+        categories are read with a single query, or from the tree index
+        when enabled, and returned in the requested order. Unknown
+        references are returned with a "Not found." detail.
+        """
+        references = self.get_batch_references(request)
+        rows = {}
+
+        if settings.TREE_INDEX:
+            for reference in references:
+                found = tree_indexes.find(reference)
+                if found is not None:
+                    index, node = found
+                    rows[reference] = index.row(node)
+
+        missing = [reference for reference in references
+                   if reference not in rows]
+        if missing:
+            rows.update(
+                (row['reference'], row) for row in
+                CategoryListSerializer.lean_data(
+                    CategoryListSerializer.lean_values(
+                        Category.objects.filter(reference__in=missing)
+                    )
+                )
+            )
+
+        return Response({'results': [
+            rows.get(reference) or OrderedDict([
+                ('reference', reference), ('detail', 'Not found.')
+            ])
+            for reference in references
+        ]})
+
+    def get_batch_references(self, request):
+        """Return the unique references of a batch request, in order."""
+        data = request.data if request.method == 'POST' \
+            else request.query_params
+        if hasattr(data, 'getlist'):
+            # Query string or form data
+            references = data.getlist('reference')
+        else:
+            references = data.get('references') \
+                if isinstance(data, dict) else None
+
+        if not references or not isinstance(references, list) or \
+                not all(isinstance(value, str) for value in references):
+            raise ValidationError(
+                {'references': 'A list of category references is required.'}
+            )
+        references = list(OrderedDict.fromkeys(references))
+        if len(references) > self.max_batch_size:
+            raise ValidationError({
+                'references': 'At most {} references.'.format(
+                    self.max_batch_size
+                )
+            })
+        return references
+
+    def get_list_version(self, queryset):
+        """Return the version of the channels of the listed categories.
+
+        Any change to a category bumps the generation of its channel, so
+        aggregating the few channels is enough and much cheaper than
+        aggregating all categories.
+        """
+        channels = Channel.objects.all()
+        if self.request.query_params.get('channel') is not None:
+            channels = channels.filter(
+                reference=self.request.query_params.get('channel')
+            )
+        return catalogue_version(channels)
+
+    @staticmethod
+    def get_object_version(instance):
+        """Return the version of the channel of the category."""
+        return channel_version(instance.channel), \
+            instance.channel.time_modified
+
+    def filter_queryset(self, queryset):
+        """Filter the categories by channel and path, if requested.
+
+        e.g. /api/v1/category/?channel=amazon&path=Books/Fantasy
+        """
+        queryset = super(CategoryViewSet, self).filter_queryset(queryset)
+        channel = self.request.query_params.get('channel')
+        path = self.request.query_params.get('path')
+
+        if channel is not None:
+            queryset = queryset.filter(channel__reference=channel)
+        if path is not None:
+            queryset = queryset.filter(path=join_path(*split_path(path)))
+        return queryset
+
+
+def metrics(request):
+    """Show the metrics of all workers in the Prometheus text format."""
+    return HttpResponse(
+        registry.render(), content_type='text/plain; version=0.0.4'
+    )
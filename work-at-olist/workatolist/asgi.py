@@ -0,0 +1,21 @@
+"""
+ASGI config for workatolist project.
+
+It exposes the ASGI callable as a module-level variable named ``application``,
+serving the WSGI application with at most ASGI_THREADS requests running
+views at the same time. e.g.:
+
+    gunicorn -k uvicorn.workers.UvicornWorker workatolist.asgi:application
+"""
+
+import os
+
+from channels.asgi import ASGIHandler
+from django.conf import settings
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "workatolist.settings")
+
+application = ASGIHandler(
+    get_wsgi_application(), threads=settings.ASGI_THREADS
+)
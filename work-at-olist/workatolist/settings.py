@@ -5,6 +5,7 @@ Configuration variables across the project should be stored in this file.
 """
 
 import os
+import tempfile
 
 from dj_database_url import parse as parse_db_url
 from prettyconf import config
@@ -48,6 +49,30 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 100
 }
 
+# Cache
+# https://docs.djangoproject.com/en/1.11/topics/cache/
+# e.g. CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache
+#      CACHE_LOCATION=/var/tmp/workatolist
+
+CACHES = {
+    'default': {
+        'BACKEND': config(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': config('CACHE_LOCATION', default=''),
+    }
+}
+
+# Cache alias and timeout (in seconds) of the serialized category trees
+TREE_CACHE = config('TREE_CACHE', default='default')
+TREE_CACHE_TIMEOUT = config('TREE_CACHE_TIMEOUT', default=86400, cast=int)
+
+# Seconds the total count of the paginated lists is cached
+PAGINATION_COUNT_TIMEOUT = config(
+    'PAGINATION_COUNT_TIMEOUT', default=60, cast=int
+)
+
 MIDDLEWARE_CLASSES = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -58,8 +83,46 @@ MIDDLEWARE_CLASSES = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'channels.middleware.MetricsMiddleware',
 ]
 
+# Directory shared by the workers to aggregate the request metrics, each
+# worker writes its histograms at most every METRICS_FLUSH_INTERVAL seconds
+METRICS_DIRECTORY = config(
+    'METRICS_DIRECTORY',
+    default=os.path.join(tempfile.gettempdir(), 'workatolist-metrics')
+)
+METRICS_FLUSH_INTERVAL = config(
+    'METRICS_FLUSH_INTERVAL', default=5, cast=float
+)
+
+# Directory of the compressed snapshots of the category trees
+SNAPSHOT_DIRECTORY = config(
+    'SNAPSHOT_DIRECTORY',
+    default=os.path.join(tempfile.gettempdir(), 'workatolist-snapshots')
+)
+
+# Serve category details and path lookups from the trees of the channels,
+# mapped from files written to TREE_INDEX_DIRECTORY whenever they change
+TREE_INDEX = config('TREE_INDEX', default=False, cast=config.boolean)
+TREE_INDEX_DIRECTORY = config(
+    'TREE_INDEX_DIRECTORY',
+    default=os.path.join(tempfile.gettempdir(), 'workatolist-tree-index')
+)
+
+# Serve the search index of the previous generation of a changed channel,
+# while the index of its new generation is built by another thread
+SEARCH_STALE_INDEX = config(
+    'SEARCH_STALE_INDEX', default=True, cast=config.boolean
+)
+
+# Views running at the same time in each ASGI process, each thread holds
+# its own database connection
+ASGI_THREADS = config('ASGI_THREADS', default=10, cast=int)
+
+# Requests slower than this are logged with their SQL
+SLOW_REQUEST_SECONDS = config('SLOW_REQUEST_SECONDS', default=1, cast=float)
+
 ROOT_URLCONF = 'workatolist.urls'
 
 TEMPLATES = [